@@ -0,0 +1,84 @@
+"""
+Benchmark of parsing consumption value strings (e.g. " 29 kWh,  2119ℓ "), as done when backfilling
+recorded values.
+
+Compares the former per unit regex search (one uncompiled re.search per unit and string) with the
+single-pass parser of vzug.consumption on a generated corpus shaped like the recorded values (totals and
+averages of washing machines and dryers). Run from the repository root:
+
+    python devtools/benchmarks/consumption.py
+"""
+import pathlib
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+
+from vzug.consumption import parse_consumption  # noqa: E402
+
+CORPUS_SIZE = 500000
+REPEAT = 3
+
+FORMER_REGEX_MATCH_LITER = r"(\d+(?:[\,\.]\d+)?).?ℓ"
+FORMER_REGEX_MATCH_KWH = r"(\d+(?:[\,\.]\d+)?).?kWh"
+
+
+def former_read_float_from_string(value_str, regex):
+    match = re.search(regex, value_str)
+    if match:
+        return float(match.group(1).replace(',', '.'))
+    return -1
+
+
+def former_parse(value_str):
+    return (former_read_float_from_string(value_str, FORMER_REGEX_MATCH_KWH),
+            former_read_float_from_string(value_str, FORMER_REGEX_MATCH_LITER))
+
+
+def build_corpus():
+    rnd = random.Random(42)
+    corpus = []
+    for _ in range(CORPUS_SIZE):
+        kind = rnd.random()
+        if kind < 0.4:
+            corpus.append(f" {rnd.randint(0, 3000)} kWh,  {rnd.randint(0, 200000)}ℓ ")
+        elif kind < 0.7:
+            corpus.append(f" {rnd.randint(0, 30) / 10} kWh,  {rnd.randint(20, 90)}ℓ ")
+        elif kind < 0.9:
+            corpus.append(f"{rnd.randint(0, 30) / 10} kWh")
+        else:
+            corpus.append(f"{rnd.randint(0, 30) / 10}".replace('.', ',') + " kWh")
+    return corpus
+
+
+def measure(parse, corpus):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for value in corpus:
+            parse(value)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    corpus = build_corpus()
+    print(f"{len(corpus)} value strings")
+
+    for value in corpus[:1000]:
+        kwh, liter = former_parse(value)
+        values = parse_consumption(value)
+        assert values.kwh == kwh and (values.liter if values.liter is not None else -1) == liter, value
+
+    baseline = None
+    for name, parse in (('former per unit search', former_parse), ('single-pass parser', parse_consumption)):
+        seconds = measure(parse, corpus)
+        baseline = baseline or seconds
+        print(f"{name:24} {seconds / len(corpus) * 1e6:6.2f} us/value  {baseline / seconds:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of the JSON decode step on the recorded device responses in test/resources.
+
+Compares the former path (bytes -> str -> str() copy -> json.loads), json.loads() on bytes and the
+decoders available through vzug.json_decoder. Run from the repository root:
+
+    python devtools/benchmarks/json_decode.py
+"""
+import json
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+
+from vzug.json_decoder import available_json_decoders  # noqa: E402
+
+RESOURCES = pathlib.Path(__file__).resolve().parents[2].joinpath('test', 'resources')
+NUMBER = 20000
+
+
+def load_payloads():
+    payloads = []
+    for path in sorted(RESOURCES.glob('*.json')):
+        body = path.read_bytes()
+        try:
+            json.loads(body)
+        except ValueError:
+            continue
+        payloads.append(body)
+    return payloads
+
+
+def decode_via_str(payloads):
+    for body in payloads:
+        json.loads(str(body.decode('utf-8')))
+
+
+def decode_bytes_stdlib(payloads):
+    for body in payloads:
+        json.loads(body)
+
+
+def make_decode(decoder):
+    def decode(payloads):
+        for body in payloads:
+            decoder(body)
+    return decode
+
+
+def main():
+    payloads = load_payloads()
+    total_bytes = sum(len(body) for body in payloads)
+    print(f"{len(payloads)} payloads, {total_bytes} bytes, {NUMBER} rounds")
+
+    candidates = {'former: str(bytes.decode())': decode_via_str, 'json.loads(bytes)': decode_bytes_stdlib}
+    for name, decoder in available_json_decoders().items():
+        candidates[f'decoder "{name}"'] = make_decode(decoder)
+
+    baseline = None
+    for name, func in candidates.items():
+        seconds = min(timeit.repeat(lambda: func(payloads), number=NUMBER, repeat=3))
+        per_payload_us = seconds / (NUMBER * len(payloads)) * 1e6
+        baseline = baseline or seconds
+        print(f"{name:32} {per_payload_us:8.2f} us/payload  {baseline / seconds:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
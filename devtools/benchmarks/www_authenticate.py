@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of parsing digest challenges (WWW-Authenticate headers).
+
+Compares the former split-based parser with the single-pass tokenizer of vzug.digest_auth, uncached and
+with the challenge cache (repeated identical challenges). Run from the repository root:
+
+    python devtools/benchmarks/www_authenticate.py
+"""
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+
+from vzug.digest_auth import parse_digest_challenge, parse_key_value_list  # noqa: E402
+
+NUMBER = 100000
+
+HEADERS = [
+    'Digest realm="Authentication Required", nonce="9f4f2c1d6a8e4b7fa5c3d2e1f0a9b8c7", '
+    'opaque="5ccc069c403ebaf9f0171e9517f40e41", qop="auth", algorithm="MD5"',
+    'Digest realm="Authentication Required",nonce="0d8f7b6a5c4e3d2c1b0a9f8e7d6c5b4a",'
+    'opaque="opaque",qop="auth",algorithm=MD5,stale=true',
+]
+
+
+def former_parse_pair(pair):
+    key, value = pair.split('=', 1)
+    if value[-1] == ',':
+        value = value[:-1]
+    if value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return str(key).strip(), str(value).strip()
+
+
+def former_parse(header):
+    parts = header.split(' ', 1)
+    if 'digest' == parts[0].lower() and len(parts) > 1:
+        return {key: value for key, value in [former_parse_pair(pair) for pair in parts[1].split(',')]}
+    return None
+
+
+def tokenizer_parse(header):
+    parts = header.split(' ', 1)
+    if 'digest' == parts[0].lower() and len(parts) > 1:
+        return parse_key_value_list(parts[1])
+    return None
+
+
+def main():
+    print(f"{len(HEADERS)} headers, {NUMBER} rounds")
+    candidates = {
+        'former split parser': former_parse,
+        'single-pass tokenizer': tokenizer_parse,
+        'tokenizer + challenge cache': parse_digest_challenge,
+    }
+
+    baseline = None
+    for name, parse in candidates.items():
+        seconds = min(timeit.repeat(lambda: [parse(header) for header in HEADERS], number=NUMBER, repeat=3))
+        per_header_us = seconds / (NUMBER * len(HEADERS)) * 1e6
+        baseline = baseline or seconds
+        print(f"{name:32} {per_header_us:8.2f} us/header  {baseline / seconds:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,36 +15,36 @@ PASSWORD = ""
 async def main():
     logconf.setup_logging()
 
-    device = Dishwasher(HOSTNAME_OR_IP, USERNAME, PASSWORD)
-    await device.load_device_information()
-    await device.load_program_details()
-
-    print("\n==== Device information")
-    print("Type:", device.device_type)
-    print("Model:", device.model_desc)
-    print("Name:", device.device_name)
-    print("Status:", device.status)
-    print("Active:", device.is_active)
-
-    print("\n==== Current Program")
-    if device.is_active:
-        print("Program name:", device.program_name)
-        print("Program status:", device.program_status)
-
-        if device.program_status == 'timed':
-            print("Start time:", device.date_time_start)
-            print("Seconds to start:", device.seconds_to_start)
-
-        print("End time:", device.date_time_end)
-        print("Seconds to end:", device.seconds_to_end)
-
-        print("Energy saving:", device.is_energy_saving)
-        print("Opti start:", device.is_opti_start)
-        print("Partialload:", device.is_partialload)
-        print("Rinse plus:", device.is_rinse_plus)
-        print("Dry plus:", device.is_dry_plus)
-    else:
-        print("No program active")
+    async with Dishwasher(HOSTNAME_OR_IP, USERNAME, PASSWORD) as device:
+        await device.load_device_information()
+        await device.load_program_details()
+
+        print("\n==== Device information")
+        print("Type:", device.device_type)
+        print("Model:", device.model_desc)
+        print("Name:", device.device_name)
+        print("Status:", device.status)
+        print("Active:", device.is_active)
+
+        print("\n==== Current Program")
+        if device.is_active:
+            print("Program name:", device.program_name)
+            print("Program status:", device.program_status)
+
+            if device.program_status == 'timed':
+                print("Start time:", device.date_time_start)
+                print("Seconds to start:", device.seconds_to_start)
+
+            print("End time:", device.date_time_end)
+            print("Seconds to end:", device.seconds_to_end)
+
+            print("Energy saving:", device.is_energy_saving)
+            print("Opti start:", device.is_opti_start)
+            print("Partialload:", device.is_partialload)
+            print("Rinse plus:", device.is_rinse_plus)
+            print("Dry plus:", device.is_dry_plus)
+        else:
+            print("No program active")
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -20,7 +20,6 @@ setup(
     include_package_data=True,
     install_requires=[
         'aiohttp>=3.8.0',
-        'tenacity>=8.0.0',
         'yarl>=1.7.0'
     ],
     tests_require=['pytest', 'flask', 'flask_httpauth', 'Flask-Testing'],
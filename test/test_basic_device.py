@@ -1,14 +1,21 @@
-from tenacity import wait_none
+import json
+import time
+import threading
+import tracemalloc
+import aiohttp
+
 from flask import Flask
 from flask import request
 from flask_testing import LiveServerTestCase
-from unittest import IsolatedAsyncioTestCase
+from unittest import IsolatedAsyncioTestCase, TestCase
+from yarl import URL
 from vzug import const
-from vzug import BasicDevice, DEVICE_TYPE_WASHING_MACHINE
+from vzug import (BasicDevice, DEVICE_TYPE_WASHING_MACHINE, HostRegistry, RetryPolicy, DeviceTimeoutError,
+                  DeviceDeadlineError, DeviceConnectionError, DeviceResponseError)
 from .util import get_test_response_from_file_raw
 
 # Disable retry wait time for better test performance
-BasicDevice.make_vzug_device_call_json.retry.wait = wait_none()
+BasicDevice.default_retry_policy = RetryPolicy(base_delay=0)
 
 
 def server_ai_ok_func():
@@ -29,6 +36,43 @@ def server_hh_ok_func():
         return 'WRONG REQUEST'
 
 
+_in_flight_lock = threading.Lock()
+_in_flight = {'current': 0, 'max': 0}
+
+
+def slow_call(func):
+    """Wrap server function to delay the response and record the max. number of concurrent requests"""
+    def wrapper():
+        with _in_flight_lock:
+            _in_flight['current'] += 1
+            _in_flight['max'] = max(_in_flight['max'], _in_flight['current'])
+        time.sleep(0.2)
+        with _in_flight_lock:
+            _in_flight['current'] -= 1
+        return func()
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def server_max_in_flight_func():
+    with _in_flight_lock:
+        max_in_flight = _in_flight['max']
+        _in_flight['max'] = 0
+    return str(max_in_flight)
+
+
+class CallRecordingDevice(BasicDevice):
+    """Basic device recording the command of every raw call"""
+
+    def __init__(self, host: str):
+        super().__init__(host)
+        self.commands = []
+
+    async def make_vzug_device_call_bytes(self, url: URL) -> bytes:
+        self.commands.append(url.query[const.QUERY_PARAM_COMMAND])
+        return await super().make_vzug_device_call_bytes(url)
+
+
 def create_app_with_func(ai_func, hh_func):
     app = Flask(__name__)
     app.config['TESTING'] = True
@@ -71,6 +115,148 @@ class TestOkResponse(LiveServerTestCase, IsolatedAsyncioTestCase):
         assert device.is_active is True
         assert device.device_type is DEVICE_TYPE_WASHING_MACHINE
 
+    async def test_raw_json_not_retained(self):
+        async with BasicDevice(self.get_server_url(), retain_raw_json=False) as device:
+            assert await device.load_device_information() is True
+
+        assert device.uuid == "test-uuid"
+        assert device.device_status.status_json is None
+        assert device.status_json == {}
+
+
+class TestRawJsonMemory(TestCase):
+
+    @staticmethod
+    def measure_bytes_per_device(retain_raw_json: bool, count: int = 200) -> float:
+        payload = get_test_response_from_file_raw('device_status_ok_resp.json')
+        registry = HostRegistry()
+        devices = [BasicDevice(f"device{i}", host_registry=registry, retain_raw_json=retain_raw_json)
+                   for i in range(count)]
+
+        tracemalloc.start()
+        try:
+            for device in devices:
+                device._apply_status_json(json.loads(payload))
+            allocated, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return allocated / count
+
+    def test_bytes_per_device(self):
+        retained = self.measure_bytes_per_device(True)
+        parsed_only = self.measure_bytes_per_device(False)
+        measured = f"{retained:.0f} bytes per device with raw JSON, {parsed_only:.0f} bytes parsed only"
+        assert parsed_only < retained / 2, measured
+
+
+class TestIdentityCache(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        return create_app_with_func(server_ai_ok_func, server_hh_ok_func)
+
+    async def test_identity_loaded_once(self):
+        async with CallRecordingDevice(self.get_server_url()) as device:
+            assert await device.load_device_information() is True
+            assert device.identity_loaded is True
+            assert sorted(device.commands) == sorted([const.COMMAND_GET_STATUS, const.COMMAND_GET_MODEL_DESC,
+                                                      const.COMMAND_GET_MACHINE_TYPE])
+
+            device.commands.clear()
+            assert await device.load_device_information() is True
+            assert device.commands == [const.COMMAND_GET_STATUS]
+            assert device.model_desc == "AdoraWash V4000"
+            assert device.device_type is DEVICE_TYPE_WASHING_MACHINE
+
+    async def test_identity_invalidation(self):
+        async with CallRecordingDevice(self.get_server_url()) as device:
+            assert await device.load_device_information() is True
+
+            device.invalidate_identity()
+            device.commands.clear()
+            assert await device.load_device_information() is True
+            assert len(device.commands) == 3
+
+    async def test_identity_reloaded_on_uuid_change(self):
+        async with CallRecordingDevice(self.get_server_url()) as device:
+            assert await device.load_device_information() is True
+
+            # Simulate a different device answering on the same host (with a different status response)
+            device._device_status = device.device_status._replace(uuid="previous-uuid")
+            device._model_desc = "Previous model"
+            device.invalidate_response_cache()
+            device.commands.clear()
+
+            assert await device.load_device_information() is True
+            assert device.commands[0] == const.COMMAND_GET_STATUS
+            assert sorted(device.commands[1:]) == sorted([const.COMMAND_GET_MODEL_DESC,
+                                                          const.COMMAND_GET_MACHINE_TYPE])
+            assert device.uuid == "test-uuid"
+            assert device.model_desc == "AdoraWash V4000"
+            assert device.identity_loaded is True
+
+
+class TestSessionHandling(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        return create_app_with_func(server_ai_ok_func, server_hh_ok_func)
+
+    async def test_owned_session_is_reused_and_closed(self):
+        async with BasicDevice(self.get_server_url()) as device:
+            assert await device.load_device_information() is True
+            session = device._get_session()
+
+            assert await device.load_device_information() is True
+            assert device._get_session() is session
+            assert session.closed is False
+
+        assert session.closed is True
+
+    async def test_injected_session_is_not_closed(self):
+        async with aiohttp.ClientSession() as session:
+            first = BasicDevice(self.get_server_url(), session=session)
+            second = BasicDevice(self.get_server_url(), session=session)
+
+            assert await first.load_device_information() is True
+            assert await second.load_device_information() is True
+
+            await first.close()
+            await second.close()
+            assert session.closed is False
+
+    async def test_shared_connector(self):
+        connector = aiohttp.TCPConnector()
+        try:
+            async with BasicDevice(self.get_server_url(), connector=connector) as device:
+                assert await device.load_device_information() is True
+
+            assert connector.closed is False
+        finally:
+            await connector.close()
+
+
+class TestConcurrentCalls(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        app = create_app_with_func(slow_call(server_ai_ok_func), slow_call(server_hh_ok_func))
+        app.route("/max_in_flight")(server_max_in_flight_func)
+        return app
+
+    async def _load_and_get_max_in_flight(self, device: BasicDevice) -> int:
+        async with device:
+            assert await device.load_device_information() is True
+            assert device.model_desc == "AdoraWash V4000"
+            assert device.device_type is DEVICE_TYPE_WASHING_MACHINE
+            resp = await device.make_vzug_device_call_raw(device.get_base_url().join(URL("max_in_flight")))
+            return int(resp)
+
+    async def test_calls_are_concurrent(self):
+        assert await self._load_and_get_max_in_flight(BasicDevice(self.get_server_url())) == 3
+
+    async def test_concurrency_cap(self):
+        device = BasicDevice(self.get_server_url(), max_concurrent_requests=1)
+        assert await self._load_and_get_max_in_flight(device) == 1
+
 
 class TestErrResponse(LiveServerTestCase, IsolatedAsyncioTestCase):
 
@@ -93,6 +279,46 @@ class TestErrResponse(LiveServerTestCase, IsolatedAsyncioTestCase):
         assert isinstance(device.error_exception.inner_exception, IOError)
 
 
+class TestTimeouts(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        def server_ai_sleep_func():
+            time.sleep(1)
+            return server_ai_ok_func()
+        return create_app_with_func(server_ai_sleep_func, server_hh_ok_func)
+
+    async def test_request_timeout(self):
+        timeout = aiohttp.ClientTimeout(total=0.2)
+        async with BasicDevice(self.get_server_url(), timeout=timeout,
+                               retry_policy=RetryPolicy(max_attempts=1)) as device:
+            loaded = await device.load_device_information()
+
+        assert loaded is False
+        assert isinstance(device.error_exception, DeviceTimeoutError)
+        assert not isinstance(device.error_exception, DeviceDeadlineError)
+        assert device.circuit_breaker.consecutive_failures > 0
+
+    async def test_request_timeout_limited_by_deadline(self):
+        policy = RetryPolicy(max_attempts=1, deadline=0.2)
+        async with BasicDevice(self.get_server_url(), retry_policy=policy, host_registry=HostRegistry()) as device:
+            start = time.monotonic()
+            loaded = await device.load_all_information()
+
+        assert loaded is False
+        assert time.monotonic() - start < 0.5
+        assert isinstance(device.error_exception, DeviceDeadlineError)
+        # The refresh budget was too small, the device is not considered failing
+        assert device.circuit_breaker.consecutive_failures == 0
+
+    async def test_connection_refused(self):
+        async with BasicDevice('localhost:1', retry_policy=RetryPolicy(max_attempts=1)) as device:
+            loaded = await device.load_device_information()
+
+        assert loaded is False
+        assert isinstance(device.error_exception, DeviceConnectionError)
+        assert isinstance(device.error_exception.inner_exception, IOError)
+
+
 class TestInvalidResponse(LiveServerTestCase, IsolatedAsyncioTestCase):
 
     def create_app(self):
@@ -105,3 +331,10 @@ class TestInvalidResponse(LiveServerTestCase, IsolatedAsyncioTestCase):
         assert loaded is False
         assert device.error_code == "n/a"
         assert isinstance(device.error_exception is not None and device.error_exception.inner_exception, ValueError)
+
+    async def test_device_information_invalid_error_type(self):
+        device = BasicDevice(self.get_server_url())
+        loaded = await device.load_device_information()
+
+        assert loaded is False
+        assert isinstance(device.error_exception, DeviceResponseError)
@@ -1,9 +1,14 @@
+import uuid
+import aiohttp
+
+from collections import Counter
 from flask import Flask
-from flask import request
+from flask import request, jsonify
 from flask_httpauth import HTTPDigestAuth
 from flask_testing import LiveServerTestCase
-from unittest import IsolatedAsyncioTestCase
-from vzug import BasicDevice
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
+from vzug import BasicDevice, HostRegistry
+from vzug.digest_auth import DigestAuth
 from vzug import const
 from .util import get_test_response_from_file_raw
 
@@ -65,3 +70,143 @@ class TestAuth(LiveServerTestCase, IsolatedAsyncioTestCase):
         assert device.error_exception is None
         assert device.device_name == "TestDevice"
         assert device.device_type == const.DEVICE_TYPE_WASHING_MACHINE
+
+
+counting_auth = HTTPDigestAuth()
+issued_nonces = set()
+responses_by_status = Counter()
+
+
+@counting_auth.get_password
+def counting_pw_func(user):
+    return USER_PW.get(user)
+
+
+@counting_auth.generate_nonce
+def generate_nonce():
+    # Nonces are not bound to the (cookie) session, like the ones of the appliances
+    nonce = uuid.uuid4().hex
+    issued_nonces.add(nonce)
+    return nonce
+
+
+@counting_auth.verify_nonce
+def verify_nonce(nonce):
+    return nonce in issued_nonces
+
+
+@counting_auth.generate_opaque
+def generate_opaque():
+    return 'opaque-value'
+
+
+@counting_auth.verify_opaque
+def verify_opaque(opaque):
+    return opaque == 'opaque-value'
+
+
+@counting_auth.login_required
+def counting_status_func():
+    return get_test_response_from_file_raw('device_status_ok_resp.json')
+
+
+@counting_auth.login_required
+def counting_machine_type_func():
+    return const.DEVICE_TYPE_SHORT_WASHING_MACHINE
+
+
+def count_response(response):
+    if request.path.startswith('/test/'):
+        return response
+    responses_by_status[response.status_code] += 1
+    return response
+
+
+# The live server runs in another process, the counters are read and reset through these routes
+def stats_func():
+    return jsonify({str(status): count for status, count in responses_by_status.items()})
+
+
+def reset_func():
+    if request.args.get('nonces'):
+        issued_nonces.clear()
+    responses_by_status.clear()
+    return 'ok'
+
+
+class TestPreemptiveAuth(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.route(f"/{const.ENDPOINT_AI}")(counting_status_func)
+        app.route(f"/{const.ENDPOINT_HH}")(counting_machine_type_func)
+        app.route("/test/stats")(stats_func)
+        app.route("/test/reset")(reset_func)
+        app.after_request(count_response)
+        return app
+
+    async def get_responses_by_status(self):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{self.get_server_url()}/test/stats") as resp:
+                return {int(status): count for status, count in (await resp.json()).items()}
+
+    async def reset_server(self, nonces=False):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{self.get_server_url()}/test/reset", params={'nonces': '1' if nonces else ''}):
+                pass
+
+    async def asyncSetUp(self):
+        await self.reset_server(nonces=True)
+
+    async def test_challenge_is_reused(self):
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            assert await device.load_device_information() is True
+            # The concurrent identity calls wait for the first challenge instead of provoking 401s
+            assert await self.get_responses_by_status() == {401: 1, 200: 3}
+
+            device.invalidate_identity()
+            assert await device.load_device_information() is True
+            assert await self.get_responses_by_status() == {401: 1, 200: 6}
+
+    async def test_persisted_challenge(self):
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            assert await device.load_device_information() is True
+            auth_state = device.auth_state
+
+        await self.reset_server()
+        async with BasicDevice(self.get_server_url(), "admin", "test-password", host_registry=HostRegistry(),
+                               auth_state=auth_state) as device:
+            assert await device.load_device_information() is True
+            assert await self.get_responses_by_status() == {200: 3}
+
+    async def test_rejected_challenge_falls_back(self):
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            assert await device.load_device_information() is True
+
+            # Server restart: the known nonce is rejected, a new challenge is requested once
+            await self.reset_server(nonces=True)
+            device.invalidate_identity()
+            assert await device.load_device_information() is True
+            responses = await self.get_responses_by_status()
+            assert responses[200] == 3
+            assert 1 <= responses[401] <= 3
+
+
+class TestDigestAuthState(TestCase):
+
+    def test_ha1_is_cached(self):
+        auth = DigestAuth("admin", "test-password",
+                          previous={'challenge': {'realm': 'Authentication Required', 'nonce': 'abc', 'qop': 'auth'}})
+
+        with mock.patch.object(auth, '_get_ha1', wraps=auth._get_ha1) as get_ha1:
+            first = auth._build_digest_header('GET', 'http://device/ai?command=getDeviceStatus')
+            second = auth._build_digest_header('GET', 'http://device/ai?command=getDeviceStatus')
+
+        assert get_ha1.call_count == 2
+        assert len(auth._ha1_cache) == 1
+        assert 'nc=00000001' in first and 'nc=00000002' in second
+        assert auth.state['nonce_count'] == 2
@@ -0,0 +1,104 @@
+from unittest import IsolatedAsyncioTestCase
+from yarl import URL
+from vzug import WashingMachine, HostRegistry
+from vzug import const
+from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
+from .util import get_test_response_from_file_raw
+
+
+class FakeWashingMachine(WashingMachine):
+    """Washing machine answering with recorded responses, counting how often the status is parsed"""
+
+    def __init__(self):
+        super().__init__('localhost_fake_host', host_registry=HostRegistry())
+        self.program_file = 'washing_machine_program_status_active.json'
+        self.inactive = False
+        self.status_parsed = 0
+        self.requests = []
+
+    async def make_vzug_device_call_bytes(self, url: URL) -> bytes:
+        self.requests.append(url.query.get(const.QUERY_PARAM_VALUE, url.query[const.QUERY_PARAM_COMMAND]))
+        return self._get_response(url).encode()
+
+    def _get_response(self, url: URL) -> str:
+        command = url.query[const.QUERY_PARAM_COMMAND]
+        value = url.query.get(const.QUERY_PARAM_VALUE)
+        if command == const.COMMAND_GET_STATUS:
+            status = get_test_response_from_file_raw('device_status_ok_resp.json')
+            return status.replace('"Inactive": "false"', '"Inactive": "true"') if self.inactive else status
+        elif command == const.COMMAND_GET_MODEL_DESC:
+            return 'AdoraWash V4000'
+        elif command == const.COMMAND_GET_MACHINE_TYPE:
+            return const.DEVICE_TYPE_SHORT_WASHING_MACHINE
+        elif command == const.COMMAND_GET_PROGRAM:
+            return get_test_response_from_file_raw(self.program_file)
+        elif value == COMMAND_VALUE_ECOM_STAT_TOTAL:
+            return get_test_response_from_file_raw('washing_machine_consumption_total.json')
+        elif value == COMMAND_VALUE_ECOM_STAT_AVG:
+            return get_test_response_from_file_raw('washing_machine_consumption_avg.json')
+        return 'WRONG REQUEST'
+
+    def _apply_status_json(self, status_json) -> None:
+        self.status_parsed += 1
+        super()._apply_status_json(status_json)
+
+
+class TestChangeDetection(IsolatedAsyncioTestCase):
+
+    async def test_unchanged_responses_are_not_parsed(self):
+        device = FakeWashingMachine()
+        changes = []
+        device.add_change_listener(lambda changed_device, changed: changes.append(changed))
+
+        assert await device.load_all_information() is True
+        assert device.status_parsed == 1
+        assert len(changes) == 1
+        assert changes[0]['status'] == ('', 'Testing')
+        assert changes[0]['program_name'] == ('', '40°C Outdoor')
+
+        assert await device.load_all_information() is True
+        assert device.status_parsed == 1
+        assert device.last_changes == {}
+        assert len(changes) == 1
+
+        # Unchanged data is still available
+        assert device.status == 'Testing'
+        assert device.program_name == '40°C Outdoor'
+        assert device.seconds_to_end == 2217
+
+    async def test_changed_program_is_reported(self):
+        device = FakeWashingMachine()
+        assert await device.load_all_information() is True
+
+        device.program_file = 'washing_machine_program_status_idle.json'
+        assert await device.load_program_details() is False
+        assert device.program_status == 'idle'
+        assert device.program_name == ''
+
+        # Same response again: still idle, nothing parsed
+        assert await device.load_program_details() is False
+        assert device.program_status == 'idle'
+
+    async def test_invalidate_response_cache(self):
+        device = FakeWashingMachine()
+        assert await device.load_device_information() is True
+        device.invalidate_response_cache()
+        assert await device.load_device_information() is True
+        assert device.status_parsed == 2
+
+    async def test_invalid_response_is_parsed_again(self):
+        device = FakeWashingMachine()
+        assert await device.load_device_information() is True
+
+        # Active program without duration: parsing fails and must not be skipped the next time
+        device.program_file = 'washing_machine_program_status_active_no_duration.json'
+        assert await device.load_program_details() is False
+        assert device.component_status(const.DATA_PROGRAM).failed
+
+        assert await device.load_program_details() is False
+        assert device.component_status(const.DATA_PROGRAM).failed
+        assert device.program_name == ''
+
+        device.program_file = 'washing_machine_program_status_active.json'
+        assert await device.load_program_details() is True
+        assert device.program_name == '40°C Outdoor'
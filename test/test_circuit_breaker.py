@@ -0,0 +1,118 @@
+import time
+
+from unittest import TestCase, IsolatedAsyncioTestCase
+from yarl import URL
+from vzug import (BasicDevice, CircuitBreaker, DeviceConnectionError, DeviceDeadlineError, DeviceError, HostRegistry,
+                  PollPolicy, RetryPolicy)
+from vzug import const
+from vzug.retry import deadline_scope
+from vzug.circuit_breaker import STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+from .util import get_test_response_from_file_raw
+
+
+class FakeHostDevice(BasicDevice):
+    """Basic device with a fake host which can be switched on and off"""
+
+    def __init__(self, circuit_breaker: CircuitBreaker):
+        super().__init__('localhost_fake_host', retry_policy=RetryPolicy(base_delay=0),
+                         circuit_breaker=circuit_breaker)
+        self.online = False
+        self.requests = []
+
+    async def _make_request(self, url: URL) -> bytes:
+        self.requests.append(url.query[const.QUERY_PARAM_COMMAND])
+        if not self.online:
+            raise DeviceConnectionError("IOError while calling device API", "n/a", ConnectionRefusedError())
+        if url.query[const.QUERY_PARAM_COMMAND] == const.COMMAND_GET_STATUS:
+            return get_test_response_from_file_raw('device_status_ok_resp.json').encode()
+        return const.DEVICE_TYPE_SHORT_WASHING_MACHINE.encode()
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_state_transitions(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        error = DeviceConnectionError("refused", "n/a")
+        assert breaker.state == STATE_CLOSED
+
+        breaker.record_failure(error)
+        assert breaker.state == STATE_CLOSED
+        breaker.record_failure(error)
+        assert breaker.state == STATE_OPEN
+        assert breaker.times_opened == 1
+        assert breaker.last_error is error
+        assert breaker.try_acquire_probe() is False
+        assert 0 < breaker.retry_in <= 0.05
+
+        time.sleep(0.06)
+        assert breaker.state == STATE_HALF_OPEN
+        assert breaker.try_acquire_probe() is True
+        assert breaker.try_acquire_probe() is False
+
+        # Failed probe opens the circuit again
+        breaker.record_failure(error)
+        assert breaker.state == STATE_OPEN
+
+        time.sleep(0.06)
+        assert breaker.try_acquire_probe() is True
+        breaker.record_success()
+        assert breaker.state == STATE_CLOSED
+        assert breaker.consecutive_failures == 0
+        assert breaker.total_failures == 3
+        assert breaker.total_successes == 1
+
+
+class TestDeviceCircuitBreaker(IsolatedAsyncioTestCase):
+
+    async def test_open_circuit_fails_fast(self):
+        device = FakeHostDevice(CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+        assert await device.load_device_information() is False
+        assert device.circuit_breaker.state == STATE_OPEN
+        # Three status attempts and two identity calls (concurrent) before the circuit opened
+        requests = len(device.requests)
+        assert requests <= 5
+
+        assert await device.load_device_information() is False
+        assert len(device.requests) == requests
+        assert isinstance(device.error_exception, DeviceConnectionError)
+        assert device.circuit_breaker.rejected_calls >= 1
+
+        assert PollPolicy(error_interval=10).next_delay(device, False) > 50
+
+    async def test_half_open_probe(self):
+        device = FakeHostDevice(CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+
+        assert await device.load_device_information() is False
+        assert device.circuit_breaker.state == STATE_OPEN
+
+        time.sleep(0.06)
+        device.online = True
+        device.requests.clear()
+
+        # The probe is a getDeviceStatus call, the model description is requested afterwards
+        model_desc = await device.make_vzug_device_call_raw(
+            device.get_command_url(const.ENDPOINT_AI, const.COMMAND_GET_MODEL_DESC))
+        assert model_desc == const.DEVICE_TYPE_SHORT_WASHING_MACHINE
+        assert device.requests == [const.COMMAND_GET_STATUS, const.COMMAND_GET_MODEL_DESC]
+        assert device.circuit_breaker.state == STATE_CLOSED
+
+        assert await device.load_device_information() is True
+
+    async def test_injected_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        breaker.record_failure(DeviceError("error", "n/a"))
+        device = BasicDevice('localhost_fake_host', circuit_breaker=breaker)
+        assert device.circuit_breaker is breaker
+        assert breaker.state == STATE_OPEN
+
+    async def test_exhausted_deadline_is_no_failure(self):
+        async with BasicDevice('localhost:1', host_registry=HostRegistry()) as device:
+            url = device.get_command_url(const.ENDPOINT_AI, const.COMMAND_GET_STATUS)
+            with deadline_scope(0):
+                for i in range(3):
+                    with self.assertRaises(DeviceDeadlineError):
+                        await device.make_vzug_device_call_raw(url)
+
+        assert device.circuit_breaker.state == STATE_CLOSED
+        assert device.circuit_breaker.consecutive_failures == 0
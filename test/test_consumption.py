@@ -0,0 +1,39 @@
+from unittest import TestCase
+from vzug import ConsumptionValues, DeviceResponseError, parse_consumption
+from vzug.basic_device import read_consumption_from_string, read_kwh_from_string
+from vzug.consumption import parse_number
+from vzug.washing_machine import read_liter_from_string
+
+
+class TestConsumptionParser(TestCase):
+
+    def test_device_strings(self):
+        assert parse_consumption(" 29 kWh,  2119ℓ ") == ConsumptionValues(kwh=29, liter=2119)
+        assert parse_consumption("0.7 kWh") == ConsumptionValues(kwh=0.7)
+        assert parse_consumption("0,7 kWh, 45,5 ℓ") == ConsumptionValues(kwh=0.7, liter=45.5)
+        assert parse_consumption("Gesamtverbrauch") == ConsumptionValues()
+
+    def test_other_units(self):
+        assert parse_consumption("700 Wh, 12 l") == ConsumptionValues(kwh=0.7, liter=12)
+        assert parse_consumption("12 liters") == ConsumptionValues()
+
+    def test_separators(self):
+        assert parse_number("2119") == 2119
+        assert parse_number("1'234.5") == 1234.5
+        assert parse_number("1.234,5") == 1234.5
+        assert parse_number("1,234.5") == 1234.5
+        assert parse_number("1.234.567") == 1234567
+        assert parse_number("1\u00a0234,5") == 1234.5
+        assert parse_number("1,234", decimal_separator='.') == 1234
+        assert parse_consumption("1'234,5 kWh, 12.000 ℓ", decimal_separator=',') == \
+               ConsumptionValues(kwh=1234.5, liter=12000)
+
+    def test_required_values(self):
+        assert read_kwh_from_string(" 29 kWh,  2119ℓ ") == 29
+        assert read_liter_from_string(" 29 kWh,  2119ℓ ") == 2119
+        assert read_consumption_from_string("0.7 kWh", 'kwh') == [0.7]
+
+        with self.assertRaises(DeviceResponseError):
+            read_kwh_from_string("2119ℓ")
+        with self.assertRaises(DeviceResponseError):
+            read_consumption_from_string("0.7 kWh", 'kwh', 'liter')
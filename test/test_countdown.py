@@ -0,0 +1,67 @@
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase, TestCase
+from vzug import ProgramState
+from .test_change_detection import FakeWashingMachine
+
+
+def age_program_state(device, seconds):
+    """Pretend the program state of the device was fetched the given seconds earlier"""
+    state = device.program_state
+    device._program_state = state._replace(fetched_at=state.fetched_at - seconds)
+
+
+class TestProgramStateCountdown(TestCase):
+
+    def test_remaining(self):
+        state = ProgramState(status='active', seconds_to_end=600, fetched_at=1000.0)
+
+        assert state.age(now=1100.0) == 100.0
+        assert state.remaining(state.seconds_to_end, now=1100.0) == 500.0
+        assert state.remaining(state.seconds_to_end, now=2000.0) == 0.0
+
+    def test_not_fetched(self):
+        state = ProgramState(status='active', seconds_to_end=600)
+
+        assert state.age() is None
+        assert state.remaining(state.seconds_to_end) == 600.0
+        assert state.refresh_due_in(300) == 0.0
+
+    def test_refresh_due_in(self):
+        assert ProgramState(status='idle', fetched_at=1000.0).refresh_due_in(300, now=1100.0) == 200.0
+        assert ProgramState(status='active', seconds_to_end=60, fetched_at=1000.0).refresh_due_in(
+            300, now=1030.0) == 30.0
+        state = ProgramState(status='timed', seconds_to_start=20, seconds_to_end=7000, fetched_at=1000.0)
+        assert state.refresh_due_in(300, now=1010.0) == 10.0
+        assert ProgramState(status='active', seconds_to_end=60, fetched_at=1000.0).refresh_due_in(
+            300, now=1100.0) == 0.0
+
+
+class TestDeviceCountdown(IsolatedAsyncioTestCase):
+
+    async def test_countdown_is_extrapolated(self):
+        device = FakeWashingMachine()
+        assert await device.load_all_information() is True
+        assert device.seconds_to_end == 2217
+        assert device.is_program_state_stale is False
+
+        age_program_state(device, 600)
+        assert device.seconds_to_end == 2217 - 600
+        end_in = (device.get_date_time_end() - datetime.now()).total_seconds()
+        assert 2217 - 601 < end_in <= 2217 - 600
+
+        # Older than max_program_state_age: a refresh is needed
+        assert device.program_refresh_due_in == 0
+        assert device.is_program_state_stale is True
+
+    async def test_change_detection_uses_fetched_values(self):
+        device = FakeWashingMachine()
+        assert await device.load_all_information() is True
+
+        age_program_state(device, 60)
+        assert await device.load_all_information() is True
+        assert device.last_changes == {}
+        assert device.get_tracked_fields()['seconds_to_end'] == 2217
+
+        # The unchanged response confirmed the state, the countdown restarts from the fetched value
+        assert device.seconds_to_end == 2217
+        assert device.program_state.age() < 1
@@ -0,0 +1,215 @@
+import re
+import uuid
+import asyncio
+import hashlib
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest import IsolatedAsyncioTestCase, TestCase
+from vzug import BasicDevice, DeviceError, HostRegistry, RetryPolicy
+from vzug import const
+from vzug.basic_device import REQUEST_HEADERS
+from vzug.digest_auth import DigestAuth, parse_digest_challenge, parse_key_value_list, _parse_digest_challenge
+
+USERNAME = "admin"
+PASSWORD = "test-password"
+REALM = "Authentication Required"
+
+UNAUTHORIZED_PAGE = "<html><body>Unauthorized Access</body></html>" + " " * 256 * 1024
+REGEX_AUTH_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+
+
+def md5(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+class DigestSimulator:
+    """
+    Digest protected device simulator (RFC 7616, qop=auth). Unlike the flask test servers it validates the
+    nonce counts: a (nonce, nc) pair used twice is rejected as a replay. Every nonce_lifetime requests the
+    nonce is rotated and requests with the old nonce are answered with stale=true.
+    """
+
+    def __init__(self, nonce_lifetime: int = 150) -> None:
+        self.nonce_lifetime = nonce_lifetime
+        self.nonce = uuid.uuid4().hex
+        self.nonce_uses = 0
+        self.used_nonce_counts = set()
+        self.replays = 0
+        self.invalid_digests = 0
+        self.challenges = 0
+        self.ok_responses = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.connections = set()
+
+    def challenge(self, stale: bool = False) -> web.Response:
+        self.challenges += 1
+        header = f'Digest realm="{REALM}",nonce="{self.nonce}",opaque="opaque",qop="auth",algorithm="MD5"'
+        if stale:
+            header += ',stale=true'
+        # Large enough not to be received together with the headers
+        return web.Response(status=401, text=UNAUTHORIZED_PAGE, headers={'WWW-Authenticate': header})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.connections.add(request.transport.get_extra_info('peername'))
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            # Give other requests the chance to interleave
+            await asyncio.sleep(0.001)
+            return self.authenticate(request)
+        finally:
+            self.concurrent -= 1
+
+    def authenticate(self, request: web.Request) -> web.Response:
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Digest '):
+            return self.challenge()
+
+        params = {key: quoted or plain for key, quoted, plain in REGEX_AUTH_PARAM.findall(header[7:])}
+        if params.get('nonce') != self.nonce:
+            return self.challenge(stale=True)
+
+        key = (params['nonce'], params['nc'])
+        if key in self.used_nonce_counts:
+            self.replays += 1
+            return self.challenge()
+        self.used_nonce_counts.add(key)
+
+        ha1 = md5(f"{USERNAME}:{REALM}:{PASSWORD}")
+        ha2 = md5(f"{request.method}:{request.path_qs}")
+        expected = md5(f"{ha1}:{params['nonce']}:{params['nc']}:{params['cnonce']}:auth:{ha2}")
+        if params.get('username') != USERNAME or params.get('uri') != request.path_qs or \
+                params.get('response') != expected:
+            self.invalid_digests += 1
+            return self.challenge()
+
+        self.nonce_uses += 1
+        if self.nonce_uses >= self.nonce_lifetime:
+            self.nonce = uuid.uuid4().hex
+            self.nonce_uses = 0
+
+        self.ok_responses += 1
+        return web.Response(text=request.query.get(const.QUERY_PARAM_COMMAND, ''))
+
+
+class TestConcurrentDigestAuth(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.simulator = DigestSimulator()
+        app = web.Application()
+        app.router.add_get(f"/{const.ENDPOINT_AI}", self.simulator.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_concurrent_requests(self):
+        headers_before = dict(REQUEST_HEADERS)
+        registry = HostRegistry()
+        host = f"{self.server.host}:{self.server.port}"
+        devices = [BasicDevice(host, USERNAME, PASSWORD, host_registry=registry, max_concurrent_requests=20,
+                               retry_policy=RetryPolicy(max_attempts=1)) for _ in range(4)]
+
+        commands = [f"command{i}" for i in range(400)]
+        results = await asyncio.gather(*[
+            devices[i % len(devices)].make_vzug_device_call_raw(
+                devices[0].get_command_url(const.ENDPOINT_AI, command))
+            for i, command in enumerate(commands)])
+
+        for device in devices:
+            await device.close()
+
+        assert results == commands
+        assert self.simulator.ok_responses == len(commands)
+        assert self.simulator.replays == 0
+        assert self.simulator.invalid_digests == 0
+        assert self.simulator.max_concurrent > 1
+        # Only the first request and requests with a rotated (stale) nonce needed a challenge
+        assert self.simulator.challenges < len(commands) / 2
+        assert REQUEST_HEADERS == headers_before
+        assert 'Authorization' not in REQUEST_HEADERS
+
+    async def test_nonce_counts_continue_per_nonce(self):
+        registry = HostRegistry()
+        auth = registry.get("device", USERNAME, PASSWORD).auth
+        old_challenge = {'realm': REALM, 'nonce': 'old', 'qop': 'auth'}
+        new_challenge = {'realm': REALM, 'nonce': 'new', 'qop': 'auth'}
+
+        headers = [auth._build_digest_header('GET', 'http://device/ai', challenge)
+                   for challenge in (old_challenge, old_challenge, new_challenge, old_challenge, new_challenge)]
+
+        # Requests still using the old challenge must not restart its count
+        assert [re.search(r'nc=(\w+)', header).group(1) for header in headers] == \
+               ['00000001', '00000002', '00000001', '00000003', '00000002']
+        assert auth.state['last_nonce'] == 'new'
+        assert auth.state['nonce_count'] == 2
+
+    async def test_challenge_reuses_connection(self):
+        host = f"{self.server.host}:{self.server.port}"
+        async with BasicDevice(host, USERNAME, PASSWORD, host_registry=HostRegistry()) as device:
+            for i in range(5):
+                url = device.get_command_url(const.ENDPOINT_AI, f"command{i}")
+                assert await device.make_vzug_device_call_raw(url) == f"command{i}"
+
+        # The 401 challenge response is released, so the authenticated retry and all further requests
+        # use the same keep-alive connection
+        assert self.simulator.challenges == 1
+        assert len(self.simulator.connections) == 1
+
+    async def test_rejected_auth_reuses_connection(self):
+        host = f"{self.server.host}:{self.server.port}"
+        async with BasicDevice(host, USERNAME, "wrong-pw", host_registry=HostRegistry(),
+                               retry_policy=RetryPolicy(max_attempts=1)) as device:
+            for i in range(3):
+                url = device.get_command_url(const.ENDPOINT_AI, f"command{i}")
+                with self.assertRaises(DeviceError):
+                    await device.make_vzug_device_call_raw(url)
+
+        assert self.simulator.challenges == 6
+        assert len(self.simulator.connections) == 1
+
+
+class TestChallengeParser(TestCase):
+
+    def test_quoted_values(self):
+        challenge = parse_digest_challenge(
+            'Digest realm="Authentication Required", Nonce="abc", qop="auth,auth-int", '
+            r'opaque="a \"quoted\", value",algorithm=MD5-sess,stale=TRUE')
+
+        assert challenge == {
+            'realm': 'Authentication Required',
+            'nonce': 'abc',
+            'qop': 'auth,auth-int',
+            'opaque': 'a "quoted", value',
+            'algorithm': 'MD5-sess',
+            'stale': 'TRUE',
+        }
+
+    def test_malformed_parameters_are_skipped(self):
+        assert parse_key_value_list('realm="x",, broken, nonce=abc ,empty=""') == \
+               {'realm': 'x', 'nonce': 'abc', 'empty': ''}
+
+    def test_other_schemes(self):
+        assert parse_digest_challenge('Basic realm="x"') is None
+        assert parse_digest_challenge('') is None
+
+    def test_cached_challenges_are_copies(self):
+        header = f'Digest realm="{REALM}", nonce="{uuid.uuid4().hex}", qop="auth"'
+        hits = _parse_digest_challenge.cache_info().hits
+
+        first = parse_digest_challenge(header)
+        first['nonce'] = 'modified'
+        second = parse_digest_challenge(header)
+
+        assert _parse_digest_challenge.cache_info().hits == hits + 1
+        assert second['nonce'] != 'modified'
+
+    def test_qop_list(self):
+        auth = DigestAuth(USERNAME, PASSWORD)
+        header = auth._build_digest_header('GET', 'http://device/ai', parse_digest_challenge(
+            f'Digest realm="{REALM}", nonce="abc", qop="auth-int, auth"'))
+
+        assert 'qop="auth"' in header
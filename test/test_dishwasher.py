@@ -1,15 +1,14 @@
-from tenacity import wait_none
 from flask import Flask
 from flask import request
 from flask_testing import LiveServerTestCase
 from unittest import IsolatedAsyncioTestCase
 from datetime import datetime
-from vzug import BasicDevice, Dishwasher, DeviceError
+from vzug import BasicDevice, Dishwasher, DeviceError, RetryPolicy
 from vzug import const
 from .util import get_test_response_from_file_raw
 
 # Disable retry wait time for better test performance
-BasicDevice.make_vzug_device_call_json.retry.wait = wait_none()
+BasicDevice.default_retry_policy = RetryPolicy(base_delay=0)
 
 
 def server_ai_status_ok_func():
@@ -141,7 +140,7 @@ class TestTimedProgramInformation(LiveServerTestCase, IsolatedAsyncioTestCase):
         loaded = await device.load_all_information()
 
         assert loaded is True
-        assert device._active is True
+        assert device.is_active is True
         assert device.program_status == "timed"
         assert device.program_name == "Éco"
         assert device.status == "Démarrage dans 1h52"
@@ -1,16 +1,15 @@
-from tenacity import wait_none
 from flask import Flask
 from flask import request
 from flask_testing import LiveServerTestCase
 from unittest import IsolatedAsyncioTestCase
 from datetime import datetime
-from vzug import BasicDevice, Dryer, DeviceError
+from vzug import BasicDevice, Dryer, DeviceError, RetryPolicy
 from vzug import const
 from vzug.dryer import CMD_VALUE_CONSUMP_DRYER_TOTAL, CMD_VALUE_CONSUMP_DRYER_AVG
 from .util import get_test_response_from_file_raw
 
 # Disable retry wait time for better test performance
-BasicDevice.make_vzug_device_call_json.retry.wait = wait_none()
+BasicDevice.default_retry_policy = RetryPolicy(base_delay=0)
 
 
 def server_ai_status_ok_func():
@@ -0,0 +1,210 @@
+import time
+import asyncio
+import threading
+import aiohttp
+
+from flask import Flask
+from flask import request
+from flask_testing import LiveServerTestCase
+from unittest import IsolatedAsyncioTestCase
+from yarl import URL
+from vzug import BasicDevice, WashingMachine, DeviceFleet, DeviceError, DeviceTimeoutError, RetryPolicy
+from vzug import const, HostRegistry
+from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
+from .util import get_test_response_from_file_raw
+
+# Disable retry wait time for better test performance
+BasicDevice.default_retry_policy = RetryPolicy(base_delay=0)
+
+_in_flight_lock = threading.Lock()
+_in_flight = {'current': 0, 'max': 0}
+
+
+def track_in_flight(func):
+    """Wrap server function to delay the response and record the max. number of concurrent requests"""
+    def wrapper():
+        with _in_flight_lock:
+            _in_flight['current'] += 1
+            _in_flight['max'] = max(_in_flight['max'], _in_flight['current'])
+        time.sleep(0.1)
+        with _in_flight_lock:
+            _in_flight['current'] -= 1
+        return func()
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def server_max_in_flight_func():
+    with _in_flight_lock:
+        max_in_flight = _in_flight['max']
+        _in_flight['max'] = 0
+    return str(max_in_flight)
+
+
+def server_ai_func():
+    cmd = request.args.get('command')
+    if cmd == const.COMMAND_GET_STATUS:
+        return get_test_response_from_file_raw('device_status_ok_resp.json')
+    elif cmd == const.COMMAND_GET_MODEL_DESC:
+        return 'AdoraWash V4000'
+    else:
+        return 'WRONG REQUEST'
+
+
+def server_hh_func():
+    cmd = request.args.get('command')
+    value = request.args.get('value')
+    if cmd == const.COMMAND_GET_PROGRAM:
+        return get_test_response_from_file_raw('washing_machine_program_status_active.json')
+    elif cmd == const.COMMAND_GET_COMMAND and value == COMMAND_VALUE_ECOM_STAT_AVG:
+        return get_test_response_from_file_raw('washing_machine_consumption_avg.json')
+    elif cmd == const.COMMAND_GET_COMMAND and value == COMMAND_VALUE_ECOM_STAT_TOTAL:
+        return get_test_response_from_file_raw('washing_machine_consumption_total.json')
+    elif cmd == const.COMMAND_GET_MACHINE_TYPE:
+        return const.DEVICE_TYPE_SHORT_WASHING_MACHINE
+    else:
+        return 'WRONG REQUEST'
+
+
+class SlowDevice(BasicDevice):
+    """Basic device with a delayed refresh"""
+
+    async def load_all_information(self) -> bool:
+        await asyncio.sleep(0.5)
+        return await super().load_all_information()
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.route(f"/{const.ENDPOINT_AI}")(track_in_flight(server_ai_func))
+    app.route(f"/{const.ENDPOINT_HH}")(track_in_flight(server_hh_func))
+    app.route("/max_in_flight")(server_max_in_flight_func)
+    return app
+
+
+class TestFleetRefresh(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        return create_app()
+
+    async def _get_max_in_flight(self) -> int:
+        async with BasicDevice(self.get_server_url()) as device:
+            return int(await device.make_vzug_device_call_raw(device.get_base_url().join(URL("max_in_flight"))))
+
+    async def test_refresh_mixed_devices(self):
+        washing_machine = WashingMachine(self.get_server_url())
+        basic_device = BasicDevice(self.get_server_url())
+        offline_device = BasicDevice('localhost_wrong_host')
+
+        async with DeviceFleet([washing_machine, basic_device, offline_device]) as fleet:
+            outcomes = await fleet.refresh()
+
+            assert [outcome.device for outcome in outcomes] == [washing_machine, basic_device, offline_device]
+            assert outcomes[0].loaded is True
+            assert outcomes[0].error is None
+            assert washing_machine.program_name == "40°C Outdoor"
+            assert washing_machine.power_consumption_kwh_total == 29.0
+
+            assert outcomes[1].loaded is True
+            assert basic_device.model_desc == "AdoraWash V4000"
+
+            assert outcomes[2].loaded is False
+            assert isinstance(outcomes[2].error, DeviceError)
+
+            # All devices share the connection pool of the fleet
+            assert washing_machine.session is basic_device.session
+            assert washing_machine.owns_session is False
+
+        assert washing_machine.owns_session is True
+        assert washing_machine.session is None
+
+    async def test_raw_json_retention(self):
+        retaining_device = BasicDevice(self.get_server_url())
+        async with DeviceFleet([retaining_device]) as fleet:
+            await fleet.refresh()
+            assert retaining_device.status_json['deviceUuid'] == "test-uuid"
+
+        lean_device = BasicDevice(self.get_server_url())
+        async with DeviceFleet([lean_device], retain_raw_json=False) as fleet:
+            await fleet.refresh()
+            assert lean_device.uuid == "test-uuid"
+            assert lean_device.status_json == {}
+
+    async def test_injected_session_is_kept(self):
+        async with aiohttp.ClientSession() as session:
+            device = BasicDevice(self.get_server_url(), session=session)
+            async with DeviceFleet([device]) as fleet:
+                outcomes = await fleet.refresh()
+                assert outcomes[0].loaded is True
+                assert device.session is session
+
+            assert session.closed is False
+
+    def _create_independent_devices(self, count: int):
+        """Devices with separate host states, so their identical calls are not coalesced"""
+        return [BasicDevice(self.get_server_url(), max_concurrent_requests=1, host_registry=HostRegistry())
+                for _ in range(count)]
+
+    async def test_per_host_limit(self):
+        devices = self._create_independent_devices(4)
+
+        async with DeviceFleet(devices, max_refreshes_per_host=1) as fleet:
+            assert all(outcome.loaded for outcome in await fleet.refresh())
+        assert await self._get_max_in_flight() == 1
+
+        async with DeviceFleet(devices, max_refreshes_per_host=2) as fleet:
+            for device in devices:
+                device.invalidate_identity()
+            assert all(outcome.loaded for outcome in await fleet.refresh())
+        assert await self._get_max_in_flight() == 2
+
+    async def test_global_limit(self):
+        devices = self._create_independent_devices(4)
+
+        async with DeviceFleet(devices, max_concurrent_refreshes=3, max_refreshes_per_host=4) as fleet:
+            assert all(outcome.loaded for outcome in await fleet.refresh())
+        assert await self._get_max_in_flight() == 3
+
+
+class TestFleetRefreshIter(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        return create_app()
+
+    async def test_refresh_iter_completion_order(self):
+        slow_device = SlowDevice(self.get_server_url())
+        fast_device = BasicDevice(self.get_server_url())
+
+        async with DeviceFleet([slow_device, fast_device], max_refreshes_per_host=2) as fleet:
+            results = [(device, outcome) async for device, outcome in fleet.refresh_iter()]
+
+        assert [device for device, _ in results] == [fast_device, slow_device]
+        for device, outcome in results:
+            assert outcome.device is device
+            assert outcome.loaded is True
+            assert outcome.error is None
+            assert outcome.started_at is not None
+            assert outcome.wait_duration >= 0
+
+        assert results[1][1].duration >= 0.5
+        assert results[0][1].duration < results[1][1].duration
+
+    async def test_refresh_iter_reports_errors(self):
+        offline_device = BasicDevice('localhost_wrong_host')
+        async with DeviceFleet([offline_device]) as fleet:
+            async for device, outcome in fleet.refresh_iter():
+                assert device is offline_device
+                assert outcome.loaded is False
+                assert isinstance(outcome.error, DeviceError)
+
+    async def test_refresh_timeout(self):
+        slow_device = SlowDevice(self.get_server_url())
+        fast_device = BasicDevice(self.get_server_url())
+
+        async with DeviceFleet([slow_device, fast_device], max_refreshes_per_host=2, refresh_timeout=0.3) as fleet:
+            outcomes = await fleet.refresh()
+
+        assert outcomes[0].loaded is False
+        assert isinstance(outcomes[0].error, DeviceTimeoutError)
+        assert outcomes[1].loaded is True
@@ -0,0 +1,75 @@
+import asyncio
+
+from unittest import IsolatedAsyncioTestCase
+from yarl import URL
+from vzug import BasicDevice, WashingMachine, HostRegistry
+from vzug import const
+from .util import get_test_response_from_file_raw
+
+
+class FakeHostDevice(BasicDevice):
+    """Basic device with a slow fake host recording all requests in a shared list"""
+
+    def __init__(self, host: str, requests: list, registry: HostRegistry, username: str = ""):
+        super().__init__(host, username, host_registry=registry)
+        self.requests = requests
+
+    async def _make_request(self, url: URL) -> bytes:
+        self.requests.append(url.query[const.QUERY_PARAM_COMMAND])
+        await asyncio.sleep(0.05)
+        if url.query[const.QUERY_PARAM_COMMAND] == const.COMMAND_GET_STATUS:
+            return get_test_response_from_file_raw('device_status_ok_resp.json').encode()
+        return const.DEVICE_TYPE_SHORT_WASHING_MACHINE.encode()
+
+
+class TestHostRegistry(IsolatedAsyncioTestCase):
+
+    def test_shared_host_state(self):
+        registry = HostRegistry()
+        first = BasicDevice('192.168.0.10', 'admin', 'pw', host_registry=registry)
+        second = WashingMachine('http://192.168.0.10', 'admin', 'pw', host_registry=registry)
+        other_user = BasicDevice('192.168.0.10', 'other', 'pw', host_registry=registry)
+
+        assert first.host_state is second.host_state
+        assert first.circuit_breaker is second.circuit_breaker
+        assert first.host_state is not other_user.host_state
+        assert len(registry) == 2
+
+    async def test_concurrent_calls_are_coalesced(self):
+        requests = []
+        registry = HostRegistry()
+        first = FakeHostDevice('192.168.0.10', requests, registry)
+        second = FakeHostDevice('192.168.0.10', requests, registry)
+
+        results = await asyncio.gather(first.load_device_information(), second.load_device_information(),
+                                       first.load_device_information())
+
+        assert results == [True, True, True]
+        assert sorted(requests) == sorted([const.COMMAND_GET_STATUS, const.COMMAND_GET_MODEL_DESC,
+                                           const.COMMAND_GET_MACHINE_TYPE])
+        assert first.device_name == second.device_name == "TestDevice"
+        assert first.host_state.in_flight_calls == 0
+
+    async def test_different_hosts_are_not_coalesced(self):
+        requests = []
+        registry = HostRegistry()
+        first = FakeHostDevice('192.168.0.10', requests, registry)
+        second = FakeHostDevice('192.168.0.11', requests, registry)
+
+        await asyncio.gather(first.load_device_information(), second.load_device_information())
+        assert len(requests) == 6
+
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        requests = []
+        registry = HostRegistry()
+        first = FakeHostDevice('192.168.0.10', requests, registry)
+        second = FakeHostDevice('192.168.0.10', requests, registry)
+        url = first.get_command_url(const.ENDPOINT_AI, const.COMMAND_GET_STATUS)
+
+        cancelled = asyncio.ensure_future(first.make_vzug_device_call_raw(url))
+        shared = asyncio.ensure_future(second.make_vzug_device_call_raw(url))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+
+        assert "TestDevice" in await shared
+        assert requests == [const.COMMAND_GET_STATUS]
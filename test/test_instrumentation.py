@@ -0,0 +1,111 @@
+from flask import Flask
+from flask_httpauth import HTTPDigestAuth
+from flask_testing import LiveServerTestCase
+from unittest import IsolatedAsyncioTestCase
+from vzug import BasicDevice, DeviceFleet, HostRegistry, RetryPolicy
+from vzug import const
+from .util import get_test_response_from_file_raw
+
+auth = HTTPDigestAuth()
+
+
+@auth.get_password
+def pw_func(user):
+    return "test-password" if user == "admin" else None
+
+
+@auth.login_required
+def status_func():
+    return get_test_response_from_file_raw('device_status_ok_resp.json')
+
+
+def machine_type_func():
+    return const.DEVICE_TYPE_SHORT_WASHING_MACHINE
+
+
+class TestRequestInstrumentation(LiveServerTestCase, IsolatedAsyncioTestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'secret key here'
+        app.route(f"/{const.ENDPOINT_AI}")(status_func)
+        app.route(f"/{const.ENDPOINT_HH}")(machine_type_func)
+        return app
+
+    async def test_request_records(self):
+        records = []
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            device.add_request_listener(records.append)
+            await device.make_vzug_device_call_json(device.get_command_url(const.ENDPOINT_AI,
+                                                                           const.COMMAND_GET_STATUS))
+            await device.make_vzug_device_call_raw(device.get_command_url(const.ENDPOINT_HH,
+                                                                          const.COMMAND_GET_MACHINE_TYPE))
+
+        assert len(records) == 2
+        status_record, type_record = records
+
+        assert status_record.host == device.host
+        assert status_record.endpoint == f"/{const.ENDPOINT_AI}"
+        assert status_record.command == const.COMMAND_GET_STATUS
+        assert status_record.status == 200
+        assert status_record.response_bytes == len(get_test_response_from_file_raw('device_status_ok_resp.json'))
+        assert status_record.attempt == 1
+        assert status_record.auth_challenge is True
+        assert status_record.succeeded is True
+        assert status_record.duration >= status_record.ttfb > 0
+        assert status_record.connect_duration > 0
+        assert status_record.connection_reused is False
+
+        assert type_record.command == const.COMMAND_GET_MACHINE_TYPE
+        assert type_record.response_bytes == len(const.DEVICE_TYPE_SHORT_WASHING_MACHINE)
+        assert type_record.auth_challenge is False
+        assert type_record.connection_reused is not None
+
+    async def test_failed_requests_and_attempts(self):
+        records = []
+        device = BasicDevice(self.get_server_url(), "admin", "wrong-pw", host_registry=HostRegistry(),
+                             retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+        device.add_request_listener(records.append)
+        assert await device.load_device_information() is False
+        await device.close()
+
+        status_records = [record for record in records if record.command == const.COMMAND_GET_STATUS]
+        assert [record.attempt for record in status_records] == [1, 2]
+        assert all(record.status == 401 and record.auth_challenge for record in status_records)
+        assert all(record.succeeded is False and record.error.is_auth_problem for record in status_records)
+
+    async def test_no_listeners(self):
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            assert await device.load_device_information() is True
+            # No trace callbacks run for requests nobody listens to
+            assert device.session.trace_configs == []
+
+    async def test_fleet_listeners(self):
+        records = []
+        device = BasicDevice(self.get_server_url(), "admin", "test-password", host_registry=HostRegistry())
+        async with DeviceFleet() as fleet:
+            fleet.add_request_listener(records.append)
+            fleet.add_device(device)
+            await fleet.refresh()
+            assert len(records) > 0
+            assert all(record.ttfb is not None for record in records)
+
+            fleet.remove_device(device)
+            records.clear()
+            await device.load_all_information()
+            assert records == []
+
+        await device.close()
+
+    async def test_listener_errors_are_ignored(self):
+        def failing_listener(record):
+            raise ValueError("listener failed")
+
+        async with BasicDevice(self.get_server_url(), "admin", "test-password",
+                               host_registry=HostRegistry()) as device:
+            device.add_request_listener(failing_listener)
+            assert await device.load_device_information() is True
+            device.remove_request_listener(failing_listener)
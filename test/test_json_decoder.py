@@ -0,0 +1,57 @@
+import json
+
+from unittest import TestCase, IsolatedAsyncioTestCase, skipUnless
+from yarl import URL
+from vzug import BasicDevice, HostRegistry
+from vzug.json_decoder import available_json_decoders, get_json_decoder, json_loads_utf8
+from .util import get_test_response_from_file_raw
+
+
+class FakeStatusDevice(BasicDevice):
+    """Basic device answering every call with the recorded device status"""
+
+    async def make_vzug_device_call_bytes(self, url: URL) -> bytes:
+        return get_test_response_from_file_raw('device_status_ok_resp.json').encode()
+
+
+class TestJsonDecoder(TestCase):
+
+    def test_default_decoder(self):
+        assert get_json_decoder() is json_loads_utf8
+        assert BasicDevice.default_json_decoder is json_loads_utf8
+        assert json_loads_utf8('{"Program": "40°C"}'.encode()) == {'Program': '40°C'}
+
+    def test_auto_decoder(self):
+        decoder = get_json_decoder('auto')
+        assert decoder in available_json_decoders().values()
+        assert decoder(b'{"a": [1, 2]}') == {'a': [1, 2]}
+
+    def test_unknown_decoder(self):
+        with self.assertRaises(ValueError):
+            get_json_decoder('does-not-exist')
+
+    def test_invalid_input_raises_value_error(self):
+        for decoder in available_json_decoders().values():
+            with self.assertRaises(ValueError):
+                decoder(b'no json response')
+
+    @skipUnless('orjson' in available_json_decoders(), 'orjson not installed')
+    def test_orjson_decoder(self):
+        assert get_json_decoder('orjson')(b'{"Status": "Testing"}') == {'Status': 'Testing'}
+
+
+class TestDeviceJsonDecoder(IsolatedAsyncioTestCase):
+
+    async def test_custom_decoder(self):
+        decoded = []
+
+        def decoder(body: bytes):
+            assert isinstance(body, bytes)
+            decoded.append(body)
+            return json.loads(body)
+
+        device = FakeStatusDevice('localhost_fake_host', json_decoder=decoder, host_registry=HostRegistry())
+        status = await device.make_vzug_device_call_json(device.get_base_url())
+
+        assert status['DeviceName'] == "TestDevice"
+        assert len(decoded) == 1
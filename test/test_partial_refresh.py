@@ -0,0 +1,94 @@
+from unittest import IsolatedAsyncioTestCase
+from vzug import const, DeviceError, DeviceFleet
+from vzug.const import DATA_IDENTITY, DATA_STATUS, DATA_PROGRAM, DATA_CONSUMPTION, DATA_OPTIDOS
+from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
+from .test_change_detection import FakeWashingMachine
+
+CONSUMPTION_REQUESTS = [COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG]
+
+
+class FlakyConsumptionWashingMachine(FakeWashingMachine):
+    """Washing machine whose consumption calls fail until consumption_available is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.consumption_available = False
+
+    async def do_consumption_details_request(self, command: str) -> str:
+        if not self.consumption_available:
+            self.requests.append(command)
+            raise DeviceError("Consumption not available", "n/a")
+        return await super().do_consumption_details_request(command)
+
+
+class TestPartialRefresh(IsolatedAsyncioTestCase):
+
+    async def test_failed_part_does_not_stop_other_parts(self):
+        device = FlakyConsumptionWashingMachine()
+
+        assert await device.load_all_information() is False
+        assert device.error_message == "Consumption not available"
+        assert device.program_name == '40°C Outdoor'
+        assert device.optidos_a_status == 'ok'
+
+        assert device.failed_parts == [DATA_CONSUMPTION]
+        consumption = device.component_status(DATA_CONSUMPTION)
+        assert consumption.failed is True
+        assert consumption.last_success is None and consumption.age() is None
+        assert isinstance(consumption.last_error, DeviceError)
+
+        for component in (DATA_IDENTITY, DATA_STATUS, DATA_PROGRAM, DATA_OPTIDOS):
+            status = device.component_status(component)
+            assert status.failed is False and status.age() < 1 and status.last_error is None
+        assert set(device.components) == {DATA_IDENTITY, DATA_STATUS, DATA_PROGRAM, DATA_OPTIDOS, DATA_CONSUMPTION}
+
+    async def test_retry_only_failed_part(self):
+        device = FlakyConsumptionWashingMachine()
+        device.inactive = True
+        assert await device.load_all_information() is False
+
+        # The next poll only repeats the failed consumption calls besides the status
+        device.consumption_available = True
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS, *CONSUMPTION_REQUESTS]
+        assert device.failed_parts == []
+
+        # The error of the last refresh is cleared and the component is fresh again
+        assert device.error_exception is None
+        consumption = device.component_status(DATA_CONSUMPTION)
+        assert consumption.failed is False
+        assert consumption.last_success > consumption.last_failure
+        assert device.water_consumption_l_total == 2119.0
+
+    async def test_refresh_failed_parts(self):
+        device = FlakyConsumptionWashingMachine()
+        assert await device.refresh() is False
+
+        device.consumption_available = True
+        device.requests.clear()
+        assert await device.refresh(parts=device.failed_parts) is True
+        assert sorted(device.requests) == sorted(CONSUMPTION_REQUESTS)
+
+    async def test_fleet_outcome(self):
+        device = FlakyConsumptionWashingMachine()
+        async with DeviceFleet([device]) as fleet:
+            outcome = await fleet.refresh_device(device)
+
+        assert outcome.loaded is False
+        assert outcome.failed_parts == [DATA_CONSUMPTION]
+        assert device.program_name == '40°C Outdoor'
+
+    async def test_fleet_outcome_reports_current_error(self):
+        device = FlakyConsumptionWashingMachine()
+        async with DeviceFleet([device]) as fleet:
+            assert (await fleet.refresh_device(device)).error.message == "Consumption not available"
+
+            # Consumption works again, no program is running any more: not loaded, but without an error
+            device.consumption_available = True
+            device.program_file = 'washing_machine_program_status_idle.json'
+            outcome = await fleet.refresh_device(device)
+
+        assert outcome.loaded is False
+        assert outcome.failed_parts == []
+        assert outcome.error is None
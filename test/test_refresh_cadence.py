@@ -0,0 +1,64 @@
+from unittest import IsolatedAsyncioTestCase
+from vzug import const
+from vzug.const import DATA_CONSUMPTION, DATA_OPTIDOS
+from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
+from .test_change_detection import FakeWashingMachine
+
+CONSUMPTION_REQUESTS = [COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG]
+
+
+class TestRefreshCadence(IsolatedAsyncioTestCase):
+
+    async def test_idle_poll_costs_one_request(self):
+        device = FakeWashingMachine()
+        device.inactive = True
+        assert await device.load_all_information() is True
+        assert sorted(device.requests) == sorted([
+            const.COMMAND_GET_STATUS, const.COMMAND_GET_MODEL_DESC, const.COMMAND_GET_MACHINE_TYPE,
+            *CONSUMPTION_REQUESTS, const.COMMAND_GET_PROGRAM])
+
+        for _ in range(3):
+            device.requests.clear()
+            assert await device.load_all_information() is True
+            assert device.requests == [const.COMMAND_GET_STATUS]
+
+        assert device.water_consumption_l_total == 2119.0
+        assert device.optidos_a_status == "ok"
+
+    async def test_program_end_invalidates_consumption(self):
+        device = FakeWashingMachine()
+        assert await device.load_all_information() is True
+
+        # Active: program details on every poll, consumption is not reloaded
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS, const.COMMAND_GET_PROGRAM]
+
+        # Program ended: consumption and optiDos are reloaded once
+        device.inactive = True
+        device.program_file = 'washing_machine_program_status_idle.json'
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS, *CONSUMPTION_REQUESTS, const.COMMAND_GET_PROGRAM]
+        assert device.program_status == 'idle'
+
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS]
+
+    async def test_refresh_intervals_and_invalidation(self):
+        device = FakeWashingMachine()
+        device.inactive = True
+        device.refresh_intervals = {DATA_CONSUMPTION: None, DATA_OPTIDOS: 0}
+        assert await device.load_all_information() is True
+
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS, const.COMMAND_GET_PROGRAM]
+
+        device.invalidate_data(DATA_CONSUMPTION)
+        assert device.is_data_due(DATA_CONSUMPTION) is True
+        device.requests.clear()
+        assert await device.load_all_information() is True
+        assert device.requests == [const.COMMAND_GET_STATUS, *CONSUMPTION_REQUESTS, const.COMMAND_GET_PROGRAM]
+        assert device.is_data_due(DATA_CONSUMPTION) is False
@@ -0,0 +1,91 @@
+import time
+
+from typing import Optional
+from unittest import TestCase, IsolatedAsyncioTestCase
+from yarl import URL
+from vzug import BasicDevice, DeviceError, DeviceFleet, RetryPolicy
+from vzug.retry import deadline_remaining, deadline_scope
+
+
+class FailingDevice(BasicDevice):
+    """Basic device where every call fails"""
+
+    def __init__(self, retry_policy: RetryPolicy):
+        super().__init__('localhost_fake_host', retry_policy=retry_policy)
+        self.attempts = 0
+
+    async def make_vzug_device_call_raw(self, url: URL) -> str:
+        return ""
+
+    async def _make_vzug_device_call_json_once(self, url: URL, digest_key: Optional[str] = None):
+        self.attempts += 1
+        raise DeviceError("Device returned error code", "503")
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(base_delay=1, multiplier=2, max_delay=5, jitter=0)
+        assert [policy.backoff(attempt) for attempt in range(1, 5)] == [1, 2, 4, 5]
+
+    def test_jitter(self):
+        policy = RetryPolicy(base_delay=2, jitter=0.5)
+        delays = [policy.backoff(1) for _ in range(100)]
+        assert all(1 <= delay <= 2 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3, deadline=None)
+        assert policy.next_delay(1) is not None
+        assert policy.next_delay(2) is not None
+        assert policy.next_delay(3) is None
+
+    def test_deadline_scope(self):
+        policy = RetryPolicy(base_delay=1, jitter=0)
+        assert deadline_remaining() is None
+
+        with deadline_scope(0.5):
+            assert 0 < deadline_remaining() <= 0.5
+            assert policy.next_delay(1) is None
+
+            # Nested scopes never extend the deadline
+            with deadline_scope(10):
+                assert deadline_remaining() <= 0.5
+
+        with deadline_scope(10):
+            assert policy.next_delay(1) == 1
+
+        assert deadline_remaining() is None
+
+
+class TestDeviceRetry(IsolatedAsyncioTestCase):
+
+    async def test_retries_per_call(self):
+        device = FailingDevice(RetryPolicy(max_attempts=4, base_delay=0, deadline=None))
+        loaded = await device.load_all_information()
+
+        assert loaded is False
+        assert device.error_code == "503"
+        assert device.attempts == 4
+
+    async def test_refresh_deadline(self):
+        device = FailingDevice(RetryPolicy(max_attempts=100, base_delay=0.1, multiplier=1, jitter=0, deadline=0.35))
+
+        start = time.monotonic()
+        loaded = await device.load_all_information()
+
+        assert loaded is False
+        # Attempts at 0.0, 0.1, 0.2 and 0.3 seconds, the next retry would exceed the deadline
+        assert time.monotonic() - start < 0.35
+        assert device.attempts == 4
+
+    async def test_fleet_retry_policy(self):
+        policy = RetryPolicy(max_attempts=1)
+        device = FailingDevice(RetryPolicy())
+
+        async with DeviceFleet([device], retry_policy=policy) as fleet:
+            assert device.retry_policy is policy
+            outcomes = await fleet.refresh()
+
+        assert outcomes[0].loaded is False
+        assert device.attempts == 1
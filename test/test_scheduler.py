@@ -0,0 +1,98 @@
+import asyncio
+
+from unittest import TestCase, IsolatedAsyncioTestCase
+from vzug import BasicDevice, Dishwasher, WashingMachine, DeviceFleet, PollPolicy, PollScheduler
+from vzug import DeviceStatus, ProgramState
+
+POLICY = PollPolicy(idle_interval=300, active_interval=60, near_event_interval=10, near_event_window=120,
+                    error_interval=30)
+
+
+class FakeWashingMachine(WashingMachine):
+    """Washing machine with a fake refresh counting the number of polls"""
+
+    def __init__(self, active: bool, seconds_to_end: int = 0):
+        super().__init__('localhost_fake_host')
+        self._device_status = DeviceStatus(is_active=active)
+        self._program_state = ProgramState(status='active' if active else 'idle', seconds_to_end=seconds_to_end)
+        self.polls = 0
+
+    async def load_all_information(self) -> bool:
+        self.polls += 1
+        return True
+
+
+class TestPollPolicy(TestCase):
+
+    def test_idle_device(self):
+        device = WashingMachine('localhost_fake_host')
+        assert POLICY.next_delay(device) == 300
+
+    def test_error(self):
+        device = BasicDevice('localhost_fake_host')
+        assert POLICY.next_delay(device, False) == 30
+
+    def test_running_program(self):
+        device = FakeWashingMachine(True, 3600)
+        assert POLICY.next_delay(device) == 60
+
+    def test_running_program_close_to_window(self):
+        device = FakeWashingMachine(True, 150)
+        assert POLICY.next_delay(device) == 30
+
+    def test_program_close_to_end(self):
+        device = FakeWashingMachine(True, 90)
+        assert POLICY.next_delay(device) == 10
+
+    def test_running_without_end(self):
+        device = FakeWashingMachine(True, 0)
+        assert POLICY.next_delay(device) == 60
+
+    def test_timed_dishwasher_close_to_start(self):
+        device = Dishwasher('localhost_fake_host')
+        device._device_status = DeviceStatus(is_active=True)
+        device._program_state = ProgramState(status='timed', seconds_to_start=60, seconds_to_end=7000)
+        assert POLICY.next_delay(device) == 10
+
+
+class TestPollScheduler(IsolatedAsyncioTestCase):
+
+    async def test_poll_frequency_follows_state(self):
+        idle_device = FakeWashingMachine(False)
+        active_device = FakeWashingMachine(True, 60)
+        outcomes = []
+
+        fleet = DeviceFleet([idle_device, active_device])
+        policy = PollPolicy(idle_interval=10, active_interval=0.05, near_event_interval=0.05, error_interval=10)
+        scheduler = PollScheduler(fleet, policy, outcomes.append)
+
+        runner = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.3)
+        scheduler.stop()
+        await runner
+        await fleet.close()
+
+        assert idle_device.polls == 1
+        assert active_device.polls >= 3
+        assert len(outcomes) == idle_device.polls + active_device.polls
+        assert 9 < scheduler.next_poll_in(idle_device) <= 10
+
+    async def test_schedule_wakes_up_scheduler(self):
+        device = FakeWashingMachine(False)
+        fleet = DeviceFleet([device])
+        scheduler = PollScheduler(fleet, PollPolicy(idle_interval=100))
+
+        runner = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.05)
+        assert device.polls == 1
+
+        scheduler.schedule(device, 0)
+        await asyncio.sleep(0.05)
+        assert device.polls == 2
+
+        scheduler.unschedule(device)
+        assert scheduler.next_poll_in(device) is None
+
+        scheduler.stop()
+        await runner
+        await fleet.close()
@@ -0,0 +1,54 @@
+import json
+
+from unittest import TestCase
+from vzug import ProgramState, OptiDosState, Dishwasher, WashingMachine
+from vzug.schema import Field, ResponseSchema, ResponseSchemaError, not_bool, to_bool
+from .util import get_test_response_from_file_raw
+
+
+class TestResponseSchema(TestCase):
+
+    def test_nested_paths_defaults_and_converters(self):
+        schema = ResponseSchema(ProgramState,
+                                Field('status', 'status'),
+                                Field('seconds_to_end', ('duration', 'act')),
+                                Field('name', ('a', 'b', 'c'), default="unknown"),
+                                Field('is_dry_plus', ('dryPlus', 'set'), converter=to_bool),
+                                Field('is_rinse_plus', 'rinsePlus', default=False, converter=not_bool))
+
+        state = schema.parse({'status': 'active', 'duration': {'act': 42}, 'dryPlus': {'set': 'true'}})
+
+        assert state == ProgramState(status='active', seconds_to_end=42, name="unknown", is_dry_plus=True,
+                                     is_rinse_plus=False)
+
+    def test_extra_values(self):
+        schema = ResponseSchema(ProgramState, Field('status', 'status'))
+        assert schema.parse({'status': 'idle'}, name="extra") == ProgramState(status='idle', name="extra")
+
+    def test_missing_required_field(self):
+        schema = ResponseSchema(ProgramState, Field('seconds_to_end', ('duration', 'act')))
+
+        with self.assertRaises(ResponseSchemaError):
+            schema.parse({'duration': {}})
+        with self.assertRaises(ResponseSchemaError):
+            schema.parse({})
+
+    def test_unexpected_structure(self):
+        schema = ResponseSchema(ProgramState, Field('seconds_to_end', ('duration', 'act')))
+
+        with self.assertRaises(ResponseSchemaError):
+            schema.parse({'duration': 42})
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            ResponseSchema(ProgramState, Field('not_a_field', 'status'))
+
+    def test_device_schemas(self):
+        program = json.loads(get_test_response_from_file_raw('washing_machine_program_status_active.json'))[0]
+        assert WashingMachine.PROGRAM_SCHEMA.parse(program).status == program['status']
+        assert isinstance(WashingMachine.OPTIDOS_SCHEMA.parse(program), OptiDosState)
+
+        program = json.loads(get_test_response_from_file_raw('dishwasher_program_status_timed.json'))[0]
+        state = Dishwasher.TIMED_PROGRAM_SCHEMA.parse(program)
+        assert state.duration == program['duration']['set']
+        assert state.seconds_to_start == program['starttime']['set']
@@ -0,0 +1,82 @@
+from unittest import IsolatedAsyncioTestCase
+from vzug import const, DeviceError, Dishwasher, HostRegistry
+from vzug.const import DATA_STATUS, DATA_PROGRAM, DATA_CONSUMPTION, DATA_OPTIDOS
+from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
+from .test_change_detection import FakeWashingMachine
+
+
+class FailingConsumptionWashingMachine(FakeWashingMachine):
+
+    async def do_consumption_details_request(self, command: str) -> str:
+        raise DeviceError("Consumption not available", "n/a")
+
+
+class TestSelectiveRefresh(IsolatedAsyncioTestCase):
+
+    async def test_plan(self):
+        device = FakeWashingMachine()
+
+        assert device.plan_refresh() == [DATA_STATUS, DATA_PROGRAM, DATA_CONSUMPTION]
+        assert device.plan_refresh(fields={'status', 'seconds_to_end', 'program_name'}) == [DATA_STATUS,
+                                                                                            DATA_PROGRAM]
+        assert device.plan_refresh(fields={'optidos_a_status'}) == [DATA_OPTIDOS]
+        # The program call also returns the optiDos data
+        assert device.plan_refresh(parts={DATA_OPTIDOS}, fields={'program_name'}) == [DATA_PROGRAM]
+        assert device.plan_refresh(parts=[]) == []
+
+        with self.assertRaises(ValueError):
+            device.plan_refresh(fields={'not_a_field'})
+        with self.assertRaises(ValueError):
+            Dishwasher('localhost', host_registry=HostRegistry()).plan_refresh(parts={DATA_CONSUMPTION})
+
+    async def test_consumption_only(self):
+        device = FakeWashingMachine()
+        assert await device.refresh(parts={DATA_CONSUMPTION}) is True
+
+        assert sorted(device.requests) == sorted([COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG])
+        assert device.power_consumption_kwh_total == 29.0
+        assert device.water_consumption_l_avg == 37.0
+        assert device.status == ""
+
+    async def test_status_board_fields(self):
+        device = FakeWashingMachine()
+        changes = []
+        device.add_change_listener(lambda changed_device, changed: changes.append(changed))
+
+        assert await device.refresh(fields=['status', 'seconds_to_end']) is True
+
+        assert sorted(device.requests) == sorted([const.COMMAND_GET_STATUS, const.COMMAND_GET_MODEL_DESC,
+                                                  const.COMMAND_GET_MACHINE_TYPE, const.COMMAND_GET_PROGRAM])
+        assert device.status == 'Testing'
+        assert device.seconds_to_end == 2217
+        assert changes[0]['seconds_to_end'] == (0, 2217)
+
+        device.requests.clear()
+        assert await device.refresh(fields=['status']) is True
+        assert device.requests == [const.COMMAND_GET_STATUS]
+
+    async def test_optidos_keeps_running_program(self):
+        device = FakeWashingMachine()
+        assert await device.load_all_information() is True
+        assert device.program_name == '40°C Outdoor'
+
+        assert await device.refresh(parts={DATA_OPTIDOS}) is True
+        assert await device.refresh(fields={'optidos_a_status'}) is True
+        assert device.optidos_a_status == 'ok'
+        assert device.program_name == '40°C Outdoor'
+        assert 2216 <= device.seconds_to_end <= 2217
+
+        # Once no program runs the optiDos load also updates the program status
+        device.program_file = 'washing_machine_program_status_idle.json'
+        assert await device.refresh(parts={DATA_OPTIDOS}) is True
+        assert device.program_status == 'idle'
+        assert device.program_name == ''
+
+    async def test_failed_part(self):
+        device = FailingConsumptionWashingMachine()
+
+        assert await device.refresh() is False
+        assert device.error_message == "Consumption not available"
+        # The other parts are loaded anyway
+        assert device.status == 'Testing'
+        assert device.program_name == '40°C Outdoor'
@@ -1,16 +1,16 @@
-from tenacity import wait_none
 from flask import Flask
 from flask import request
 from flask_testing import LiveServerTestCase
 from unittest import IsolatedAsyncioTestCase
 from datetime import datetime
-from vzug import BasicDevice, WashingMachine, DeviceError
+from vzug import BasicDevice, WashingMachine, DeviceError, RetryPolicy
+from vzug import ConsumptionStats, OptiDosState, ProgramState
 from vzug import const
 from vzug.washing_machine import COMMAND_VALUE_ECOM_STAT_TOTAL, COMMAND_VALUE_ECOM_STAT_AVG
 from .util import get_test_response_from_file_raw
 
 # Disable retry wait time for better test performance
-BasicDevice.make_vzug_device_call_json.retry.wait = wait_none()
+BasicDevice.default_retry_policy = RetryPolicy(base_delay=0)
 
 
 def server_ai_status_ok_func():
@@ -104,6 +104,26 @@ class TestOkAndActiveProgramInformation(LiveServerTestCase, IsolatedAsyncioTestC
         assert device.optidos_a_status == "ok"
         assert device.optidos_b_status == "ok"
 
+    async def test_state_snapshots(self):
+        device = WashingMachine(self.get_server_url())
+        initial_program_state = device.program_state
+        assert await device.load_all_information() is True
+
+        # Snapshots are replaced as a whole, references held by readers never change
+        assert initial_program_state == ProgramState()
+        assert device.program_state == ProgramState(status="active", name="40°C Outdoor", seconds_to_end=2217,
+                                                    fetched_at=device.program_state.fetched_at)
+        assert device.program_state.fetched_at is not None
+        assert device.optidos_state == OptiDosState(active=True, config="detergentAandB", a_status="ok",
+                                                    b_status="ok")
+        assert device.consumption_stats == ConsumptionStats(29.0, 0.6, 2119.0, 37.0)
+        assert device.device_status.uuid == "test-uuid"
+        assert device.device_status.status_json is device.status_json
+
+        with self.assertRaises(AttributeError):
+            device.program_state.name = "changed"
+        assert not hasattr(device.program_state, '__dict__')
+
     async def test_program_information_wrong_address(self):
         device = WashingMachine('localhost_wrong_host')
         active = await device.load_program_details()
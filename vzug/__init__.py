@@ -1,6 +1,15 @@
 # __init__.py
-from .basic_device import BasicDevice, DeviceError, strtobool
+from .basic_device import (BasicDevice, DeviceError, DeviceTimeoutError, DeviceDeadlineError, DeviceConnectionError,
+                           DeviceResponseError, strtobool)
+from .retry import RetryPolicy
+from .circuit_breaker import CircuitBreaker
+from .host_registry import HostRegistry
+from .state import DeviceStatus, ProgramState, ConsumptionStats, OptiDosState, ComponentStatus
+from .consumption import ConsumptionValues, parse_consumption
+from .instrumentation import RequestRecord, create_trace_config
 from .washing_machine import WashingMachine
 from .dryer import Dryer
 from .dishwasher import Dishwasher
+from .fleet import DeviceFleet, RefreshOutcome
+from .scheduler import PollPolicy, PollScheduler
 from .const import DEVICE_TYPE_UNKNOWN, DEVICE_TYPE_WASHING_MACHINE, DEVICE_TYPE_DRYER
@@ -1,43 +1,60 @@
 from __future__ import annotations
 
-import re
-import json
+import time
+import asyncio
 import aiohttp
 import aiohttp.web
 import logging
 
 from .util import strtobool
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Awaitable, Callable, Dict, Iterable, List, Tuple
 from yarl import URL
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type, before_log
 from .const import (QUERY_PARAM_COMMAND, QUERY_PARAM_VALUE, COMMAND_GET_STATUS, COMMAND_GET_MODEL_DESC,
                     COMMAND_GET_MACHINE_TYPE, ENDPOINT_AI, VERSION, DEVICE_TYPE_UNKNOWN, DEVICE_TYPE_MAPPING,
-                    ENDPOINT_HH, COMMAND_GET_COMMAND)
+                    ENDPOINT_HH, COMMAND_GET_COMMAND, DATA_IDENTITY, DATA_STATUS)
+from .retry import RetryPolicy, deadline_remaining, deadline_scope
+from .circuit_breaker import CircuitBreaker
+from .json_decoder import JsonDecoder, get_json_decoder
+from .instrumentation import RequestListener, RequestRecord, create_trace_config, current_attempt, _request_attempt
 from .digest_auth import DigestAuth
+from .host_registry import HostRegistry, HostState, default_host_registry
+from .state import ComponentStatus, DeviceStatus, EMPTY_COMPONENT_STATUS, EMPTY_DEVICE_STATUS
+from .schema import Field, ResponseSchema, not_bool
+from .consumption import parse_consumption
 
 REQUEST_HEADERS = {
     f"User-Agent": f"vzug-lib/{VERSION}",
     "Accept": f"application/json, text/plain, */*",
 }
 
+DEFAULT_MAX_CONCURRENT_REQUESTS = 3
+DEFAULT_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3, sock_read=5)
+
 CONSUMPTION_DETAILS_VALUE = 'value'
-REGEX_MATCH_KWH = r"(\d+(?:[\,\.]\d+)?).?kWh"
 
 
-def read_kwh_from_string(value_str: str) -> float:
-    kwh = read_float_from_string(value_str, REGEX_MATCH_KWH)
-    if kwh < 0:
-        raise DeviceError('Cannot find kWh value in string {0}'.format(value_str), 'n/a')
+def read_consumption_from_string(value_str: str, *fields: str) -> List[float]:
+    """Return the given values (e.g. 'kwh', 'liter') of the consumption string, all of them must be present"""
+    values = parse_consumption(value_str)
+    result = []
+    for field in fields:
+        value = getattr(values, field)
+        if value is None:
+            raise DeviceResponseError('Cannot find {0} value in string {1}'.format(field, value_str), 'n/a')
+        result.append(value)
 
-    return kwh
+    return result
 
 
-def read_float_from_string(value_str: str, regex: str) -> float:
-    match = re.search(regex, value_str)
-    if match:
-        return float(match.group(1).replace(',', '.'))
+def read_kwh_from_string(value_str: str) -> float:
+    return read_consumption_from_string(value_str, 'kwh')[0]
 
-    return -1
+
+def unwrap_call_result(result: Any) -> Any:
+    """Return the result of a call made with BasicDevice._gather_calls() or raise its exception"""
+    if isinstance(result, BaseException):
+        raise result
+    return result
 
 
 class DeviceAuthError(Exception):
@@ -45,7 +62,7 @@ class DeviceAuthError(Exception):
 
 
 class DeviceError(Exception):
-    def __init__(self, message, err_code: str, inner_exception: Exception = None):
+    def __init__(self, message, err_code: str, inner_exception: Optional[Exception] = None):
         super().__init__(message)
         self._device_err_code = err_code
         self._message = message
@@ -68,29 +85,170 @@ class DeviceError(Exception):
         return isinstance(self.inner_exception, DeviceAuthError)
 
 
+class DeviceTimeoutError(DeviceError):
+    """The device did not answer in time (request timeout or refresh deadline exceeded)"""
+
+
+class DeviceDeadlineError(DeviceTimeoutError):
+    """
+    The refresh deadline ran out before the device answered (also before the request was sent). The budget of
+    the caller was too small, so unlike other timeouts it does not count as a failure of the device.
+    """
+
+
+class DeviceConnectionError(DeviceError):
+    """The device could not be reached (connection refused, host unknown, connection dropped)"""
+
+
+class DeviceResponseError(DeviceError):
+    """The device answered with an invalid / unexpected payload"""
+
+
 class BasicDevice:
     """Class containing basic functions valid to any V-ZUG device"""
 
-    def __init__(self, host: str, username: str = "", password: str = "") -> None:
+    # Retry policy used by devices created without a specific retry policy
+    default_retry_policy = RetryPolicy()
+
+    # JSON decoder used by devices created without a specific decoder (see json_decoder.get_json_decoder())
+    default_json_decoder: JsonDecoder = staticmethod(get_json_decoder())
+
+    # Mapping of the getDeviceStatus response to the device status
+    STATUS_SCHEMA = ResponseSchema(
+        DeviceStatus,
+        Field('serial', 'Serial'),
+        Field('device_name', 'DeviceName'),
+        Field('status', 'Status'),
+        Field('uuid', 'deviceUuid'),
+        Field('program', 'Program'),
+        Field('is_active', 'Inactive', converter=not_bool))
+
+    # Fields compared before and after every refresh to report changes to the change listeners
+    TRACKED_FIELDS: Tuple[str, ...] = ('device_name', 'serial', 'uuid', 'status', 'program', 'is_active')
+
+    # Refresh cadences of semi-static data (e.g. DATA_CONSUMPTION -> seconds): load_all_information() only
+    # reloads them when they are older or were invalidated, None: only when invalidated
+    refresh_intervals: Dict[str, Optional[float]] = {}
+
+    # Semi-static data invalidated when the device becomes inactive (a program ended)
+    INVALIDATE_WHEN_INACTIVE: Tuple[str, ...] = ()
+
+    # Fields of the device -> part of the device data providing them (see refresh())
+    FIELD_PARTS: Dict[str, str] = dict.fromkeys(
+        ('device_name', 'serial', 'uuid', 'status', 'program', 'is_active', 'device_status', 'status_json',
+         'model_desc', 'device_type'), DATA_STATUS)
+
+    # Parts also loaded by the call of another part (part -> covered parts)
+    PART_COVERS: Dict[str, Tuple[str, ...]] = {}
+
+    def __init__(self, host: str, username: str = "", password: str = "",
+                 session: Optional[aiohttp.ClientSession] = None,
+                 connector: Optional[aiohttp.BaseConnector] = None,
+                 max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 timeout: Optional[aiohttp.ClientTimeout] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 host_registry: Optional[HostRegistry] = None,
+                 json_decoder: Optional[JsonDecoder] = None,
+                 auth_state: Optional[Dict[str, Any]] = None,
+                 retain_raw_json: bool = True) -> None:
         self._host = host
         self._username = username
         self._password = password
-        self._serial = ""
+        self._device_status = EMPTY_DEVICE_STATUS
+        self._retain_raw_json = retain_raw_json
         self._model_desc = ""
-        self._device_name = ""
-        self._status = ""
-        self._status_json: Dict[Any, Any] = {}
-        self._program = ""
         self._error_code = ""
         self._error_message = ""
         self._error_exception: Optional[DeviceError] = None
-        self._uuid = ""
-        self._active = False
         self._device_information_loaded = False
+        self._identity_loaded = False
+        self._data_loaded_at: Dict[str, float] = {}
+        self._components: Dict[str, ComponentStatus] = {}
+        self._response_digests: Dict[str, int] = {}
+        self._last_changes: Dict[str, Tuple[Any, Any]] = {}
+        self._change_listeners: List[Callable[[BasicDevice, Dict[str, Tuple[Any, Any]]], Any]] = []
+        self._request_listeners: List[RequestListener] = []
         self._device_type_short = ""
         self._device_type: Optional[str] = DEVICE_TYPE_UNKNOWN
         self._logger = logging.getLogger(__name__)
-        self._auth_previous: Dict[str, str] = {}
+        self._session = session
+        self._connector = connector
+        self._owns_session = session is None
+        self._max_concurrent_requests = max_concurrent_requests
+        self._request_semaphore: Optional[asyncio.Semaphore] = None
+        self._retry_policy = retry_policy if retry_policy is not None else self.default_retry_policy
+        self._timeout = timeout if timeout is not None else DEFAULT_REQUEST_TIMEOUT
+        registry = host_registry if host_registry is not None else default_host_registry
+        self._host_state = registry.get(host, username, password)
+        self._circuit_breaker = circuit_breaker if circuit_breaker is not None else self._host_state.circuit_breaker
+        self._json_decoder = json_decoder if json_decoder is not None else type(self).default_json_decoder
+        if auth_state is not None and self._host_state.auth.challenge is None:
+            # Persisted challenge (see auth_state): authenticate preemptively from the first request
+            self._host_state.auth = DigestAuth(username, password, previous=auth_state)
+
+    async def __aenter__(self) -> BasicDevice:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the HTTP session owned by this device. Injected sessions and connectors are
+        left untouched because they may be shared with other devices.
+        """
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def attach_session(self, session: Optional[aiohttp.ClientSession]) -> None:
+        """
+        Use the given shared session for all further calls. The device does not take ownership of the
+        session. Passing None switches back to a session owned by the device.
+        """
+        if session is self._session:
+            return
+
+        await self.close()
+        self._session = session
+        self._owns_session = session is None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the HTTP session used for all calls of this device. If no session was injected a
+        long-lived session is created on first use so keep-alive connections are reused across polls. The
+        trace config timing the requests is only added if request listeners are registered at that point.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=self._connector,
+                                                  connector_owner=self._connector is None,
+                                                  trace_configs=[create_trace_config()] if self._request_listeners
+                                                  else None)
+        return self._session
+
+    def _get_request_semaphore(self) -> asyncio.Semaphore:
+        """Semaphore limiting the number of concurrent requests to this device (created in the running loop)"""
+        if self._request_semaphore is None:
+            self._request_semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        return self._request_semaphore
+
+    def _get_request_timeout(self) -> aiohttp.ClientTimeout:
+        """Timeout of the next request: the configured timeout, shortened to the deadline of the running refresh"""
+        remaining = deadline_remaining()
+        if remaining is None or (self._timeout.total is not None and self._timeout.total <= remaining):
+            return self._timeout
+
+        return aiohttp.ClientTimeout(total=remaining, connect=self._timeout.connect,
+                                     sock_read=self._timeout.sock_read, sock_connect=self._timeout.sock_connect)
+
+    async def _gather_calls(self, *calls: Awaitable[Any]) -> List[Any]:
+        """
+        Run independent device calls concurrently (bounded by max_concurrent_requests) and return
+        the results in call order. Failed calls are returned as exception objects, use
+        unwrap_call_result() to merge the results in a deterministic order.
+        """
+        return list(await asyncio.gather(*calls, return_exceptions=True))
 
     def get_base_url(self) -> URL:
         return URL.build(scheme='http', host=self._host.replace("http://", ""))
@@ -102,105 +260,464 @@ class BasicDevice:
         """
         Make raw service call to any V-Zug device and return the response as text
         """
+        return (await self.make_vzug_device_call_bytes(url)).decode("utf-8")
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                self._logger.debug("Raw service call URL: %s", str(url))
+    async def make_vzug_device_call_bytes(self, url: URL) -> bytes:
+        """
+        Make raw service call to any V-Zug device and return the undecoded response body. Identical calls to
+        the same host made concurrently (also by other device instances) share one request, made with the
+        session, timeout, refresh deadline and request listeners of the first caller. While the circuit
+        breaker of the device is open the call fails fast with the last connection / timeout error. When it
+        is half-open a single getDeviceStatus probe decides whether the device is reachable again.
+        """
+        return await self._host_state.single_flight(str(url), lambda: self._make_breaker_call(url))
+
+    async def _make_breaker_call(self, url: URL) -> bytes:
+        breaker = self._circuit_breaker
+        if not breaker.is_closed:
+            if not breaker.try_acquire_probe():
+                breaker.record_rejected()
+                self._logger.debug("Circuit of %s is %s, call rejected: %s", self._host, breaker.state, str(url))
+                raise self._get_circuit_open_error()
+
+            self._logger.info("Circuit of %s is half-open, probing device", self._host)
+            status_url = self.get_command_url(ENDPOINT_AI, COMMAND_GET_STATUS)
+            if url != status_url:
+                await self._make_guarded_call(status_url)
+
+        return await self._make_guarded_call(url)
+
+    def _get_circuit_open_error(self) -> DeviceError:
+        """Copy of the error that opened the circuit (a copy, so tracebacks do not pile up on one instance)"""
+        last_error = self._circuit_breaker.last_error
+        if isinstance(last_error, DeviceError):
+            return type(last_error)(last_error.message, last_error.error_code, last_error.inner_exception)
+        return DeviceConnectionError("Device is considered offline", "n/a", last_error)
+
+    async def _make_guarded_call(self, url: URL) -> bytes:
+        """Make the raw call and record the result in the circuit breaker"""
+        try:
+            body = await self._make_request(url)
+        except DeviceDeadlineError:
+            # Client side budget exhausted, the device may be fine
+            self._circuit_breaker.release_probe()
+            raise
+        except (DeviceTimeoutError, DeviceConnectionError) as e:
+            self._circuit_breaker.record_failure(e)
+            raise
+        except DeviceError:
+            # The device answered (e.g. authentication problem), so it is reachable
+            self._circuit_breaker.record_success()
+            raise
+        except BaseException:
+            self._circuit_breaker.release_probe()
+            raise
+
+        self._circuit_breaker.record_success()
+        return body
+
+    async def _make_request(self, url: URL) -> bytes:
+        # Without request listeners no record is created, so instrumentation costs nothing
+        if not self._request_listeners:
+            return await self._send_request(url, None)
+
+        record = RequestRecord(self._host, url, current_attempt())
+        try:
+            body = await self._send_request(url, record)
+        except BaseException as e:
+            record.finish(record.status, error=e)
+            self._notify_request(record)
+            raise
+
+        record.finish(record.status, len(body))
+        self._notify_request(record)
+        return body
+
+    async def _send_request(self, url: URL, record: Optional[RequestRecord]) -> bytes:
+        timeout = self._timeout
+        try:
+            self._logger.debug("Raw service call URL: %s", str(url))
+
+            async with self._get_request_semaphore():
+                remaining = deadline_remaining()
+                if remaining is not None and remaining <= 0:
+                    err_msg = "Refresh deadline exceeded before calling device API"
+                    self._logger.error(err_msg)
+                    raise DeviceDeadlineError(err_msg, "n/a")
+
+                timeout = self._get_request_timeout()
+                resp, auth_challenge = await self._host_state.auth.send(
+                    self._get_session(), 'GET', url, headers=REQUEST_HEADERS,
+                    timeout=timeout, trace_request_ctx=record)
 
-                auth = DigestAuth(self._username, self._password, session, self._auth_previous)
-                resp = await auth.request('GET', url=url, headers=REQUEST_HEADERS)
-                self._auth_previous = {
-                    'nonce_count': auth.nonce_count,
-                    'last_nonce': auth.last_nonce,
-                    'challenge': auth.challenge,
-                }
+                if record is not None:
+                    record.status = resp.status
+                    record.auth_challenge = auth_challenge
 
                 if aiohttp.web.HTTPUnauthorized.status_code == resp.status:
+                    # Drain the body before releasing, otherwise the keep-alive connection is closed
+                    await resp.read()
+                    resp.release()
                     err_msg = "Authentication problem occurred while calling device API"
                     self._logger.error(err_msg)
                     raise DeviceError(err_msg, "n/a", DeviceAuthError())
 
-                txt_resp = await resp.read()
-                self._logger.debug("Raw response from %s: status %s, text: %s", self._host, resp.status, txt_resp)
-                return txt_resp.decode("utf-8")
+                body = await resp.read()
+
+            self._logger.debug("Raw response from %s: status %s, text: %s", self._host, resp.status, body)
+            return body
+
+        except asyncio.TimeoutError as e:
+            # Checked first: asyncio.TimeoutError is an IOError since python 3.11
+            if timeout is not self._timeout and not isinstance(e, aiohttp.ServerTimeoutError):
+                # The total timeout shortened to the refresh deadline fired (connect / read timeouts are not
+                # shortened and raise ServerTimeoutError)
+                err_msg = "Refresh deadline exceeded while calling device API"
+                self._logger.error("%s: %s", err_msg, str(url))
+                raise DeviceDeadlineError(err_msg, "n/a", e)
 
-            except IOError as e:
-                err_msg = "IOError while calling device API"
-                self._logger.error("%s: %s", err_msg, str(e))
-                raise DeviceError(err_msg, "n/a", e)
+            err_msg = "Timeout while calling device API"
+            self._logger.error("%s: %s", err_msg, str(url))
+            raise DeviceTimeoutError(err_msg, "n/a", e)
+
+        except (IOError, aiohttp.ClientError) as e:
+            err_msg = "IOError while calling device API"
+            self._logger.error("%s: %s", err_msg, str(e))
+            raise DeviceConnectionError(err_msg, "n/a", e)
+
+    def add_request_listener(self, listener: RequestListener) -> None:
+        """
+        Register a callback called with a RequestRecord (latency, size, status, attempt, auth round trip)
+        after every request sent to the device. Listeners are called synchronously, keep them cheap.
+        """
+        self._request_listeners.append(listener)
+
+    def remove_request_listener(self, listener: RequestListener) -> None:
+        self._request_listeners.remove(listener)
+
+    def _notify_request(self, record: RequestRecord) -> None:
+        for listener in self._request_listeners:
+            try:
+                listener(record)
+            except Exception:
+                self._logger.exception("Error in request listener of %s", self._host)
 
-    @retry(stop=stop_after_attempt(3),
-           wait=wait_fixed(2),
-           retry=retry_if_exception_type(DeviceError),
-           before=before_log(logging.getLogger(__name__), logging.DEBUG),
-           reraise=True)
     async def make_vzug_device_call_json(self, url: URL) -> Dict:
         """
         Make service call for any V-Zug device and check if there is an error code in json response.
-        Sometimes the devices returns an internal error (like 503). In this case DeviceError exception
-        is raised after 3 retries.
+        Sometimes the devices returns an internal error (like 503). In this case the call is retried
+        according to the retry policy of the device and DeviceError is raised if all attempts failed
+        or the deadline of the running refresh is reached.
         """
+        return await self._make_json_call(url, None)
 
+    async def make_vzug_device_call_json_if_changed(self, url: URL, key: str) -> Optional[Any]:
+        """
+        Same as make_vzug_device_call_json(), but return None without parsing the response if it is
+        identical to the last response returned for the given key.
+        """
+        return await self._make_json_call(url, key)
+
+    def invalidate_response_cache(self) -> None:
+        """Forget the last responses, so the next calls are parsed even if the responses did not change"""
+        self._response_digests.clear()
+
+    async def _make_json_call(self, url: URL, digest_key: Optional[str]) -> Any:
+        attempt = 0
+        while True:
+            attempt += 1
+            token = _request_attempt.set(attempt)
+            try:
+                return await self._make_vzug_device_call_json_once(url, digest_key)
+            except DeviceError as e:
+                delay = self._retry_policy.next_delay(attempt)
+                if delay is None or not self._circuit_breaker.is_closed:
+                    raise
+
+                self._logger.debug("Attempt %d calling %s failed (%s), retrying in %.1f seconds",
+                                   attempt, str(url), e.message, delay)
+                await asyncio.sleep(delay)
+            finally:
+                _request_attempt.reset(token)
+
+    async def _make_vzug_device_call_json_once(self, url: URL, digest_key: Optional[str] = None) -> Any:
         try:
-            text_resp = str(await self.make_vzug_device_call_raw(url))
+            # Decode straight from the response bytes, without an intermediate str copy
+            body = await self.make_vzug_device_call_bytes(url)
 
-            json_resp = json.loads(text_resp)
+            digest = hash(body)
+            if digest_key is not None and self._response_digests.get(digest_key) == digest:
+                self._logger.debug("Response of %s did not change, skip parsing", str(url))
+                return None
+
+            json_resp = self._json_decoder(body)
             if "error" in json_resp:
                 err_code = json_resp['error']['code']
                 self._logger.error("Device returned error code: %s", err_code)
                 raise DeviceError("Device returned error code", err_code)
+
+            if digest_key is not None:
+                self._response_digests[digest_key] = digest
             return json_resp
 
         except ValueError as e:
             err_msg = "Got invalid response from device"
             self._logger.error("%s: %s", err_msg, str(e))
-            raise DeviceError(err_msg, "n/a", e)
+            raise DeviceResponseError(err_msg, "n/a", e)
 
     async def load_all_information(self) -> bool:
         """
-        For the basic device forward the call to load_device_information().
-        Method can be overridden by subclasses to load device specific
-        information.
+        Load all information of the device within the deadline of the retry policy. Subclasses
+        extend _load_all_information() to load device specific information.
         """
-        return await self.load_device_information()
+        self._clear_error()
+        before = self.get_tracked_fields()
+        with deadline_scope(self._retry_policy.deadline):
+            loaded = await self._load_all_information()
 
-    async def load_device_information(self) -> bool:
-        """Load device status information by calling the corresponding API endpoint"""
+        self._notify_changes(before)
+        return loaded
 
-        try:
-            self._logger.info("Loading device information for %s", self._host)
-            self._status_json = await self.make_vzug_device_call_json(
-                self.get_command_url(ENDPOINT_AI, COMMAND_GET_STATUS))
-
-            self._error_code = ""
-            self._serial = self._status_json['Serial']
-            self._device_name = self._status_json['DeviceName']
-            self._status = self._status_json['Status']
-            self._uuid = self._status_json['deviceUuid']
-            self._program = self._status_json['Program']
-            self._active = not strtobool(self._status_json['Inactive'])
-
-            # Load model description in separate call
-            self._model_desc = await self.make_vzug_device_call_raw(
-                self.get_command_url(ENDPOINT_AI, COMMAND_GET_MODEL_DESC))
-
-            # Load short device type in separate call
-            self._device_type_short = await self.make_vzug_device_call_raw(
-                self.get_command_url(ENDPOINT_HH, COMMAND_GET_MACHINE_TYPE))
+    async def refresh(self, parts: Optional[Iterable[str]] = None, fields: Optional[Iterable[str]] = None) -> bool:
+        """
+        Load only the given parts of the device data (e.g. DATA_CONSUMPTION) and the parts providing the given
+        fields (e.g. 'seconds_to_end'), everything if neither is given. The planned calls (see plan_refresh())
+        run concurrently. Unlike load_all_information() the parts are loaded regardless of their cadence.
+        Returns False if a part could not be loaded (see error_exception).
+        """
+        loaders = self._part_loaders()
+        planned = self.plan_refresh(parts, fields)
+        self._logger.info("Refreshing %s of %s", ", ".join(planned), self._host)
+
+        self._clear_error()
+        before = self.get_tracked_fields()
+        with deadline_scope(self._retry_policy.deadline):
+            results = await self._gather_calls(*[self._load_part(part, loaders[part]) for part in planned])
+        self._notify_changes(before)
+
+        loaded = True
+        for result in results:
+            if isinstance(result, DeviceError):
+                self._error_code = result.error_code
+                self._error_message = result.message
+                self._error_exception = result
+                loaded = False
+            elif isinstance(result, BaseException):
+                raise result
+
+        return loaded
+
+    def _clear_error(self) -> None:
+        """Forget the error of the last refresh, so error_exception only reports errors of the running one"""
+        self._error_code = ""
+        self._error_message = ""
+        self._error_exception = None
 
-            self._set_device_type()
-            self._device_information_loaded = True
+    def plan_refresh(self, parts: Optional[Iterable[str]] = None,
+                     fields: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Return the parts refresh() loads for the given parts and fields: each part once and without parts
+        covered by the call of another requested part (e.g. optiDos data is part of the program response)
+        """
+        loaders = self._part_loaders()
+        if parts is None and fields is None:
+            requested = set(loaders)
+        else:
+            requested = set(parts or ())
+            for field in fields or ():
+                if field not in self.FIELD_PARTS:
+                    raise ValueError(f"Unknown field {field} of {type(self).__name__}")
+                requested.add(self.FIELD_PARTS[field])
 
-            self._logger.info("Got device information. Type: %s, model: %s, serial: %s, uuid: %s, name: %s, status: %s",
-                              self.device_type, self.model_desc, self.serial, self.uuid, self.device_name, self.status)
-            return True
+        unknown = requested - loaders.keys()
+        if unknown:
+            raise ValueError(f"Unknown parts {', '.join(sorted(unknown))} of {type(self).__name__}")
+
+        covered = {covered for part in requested for covered in self.PART_COVERS.get(part, ())}
+        return [part for part in loaders if part in requested and part not in covered]
+
+    def _part_loaders(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        """Functions loading the parts of the device data for refresh(), raising DeviceError on failure"""
+        return {DATA_STATUS: self._fetch_device_information}
+
+    def get_tracked_fields(self) -> Dict[str, Any]:
+        """Current values of all fields listed in TRACKED_FIELDS"""
+        return {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+
+    def add_change_listener(self, listener: Callable[[BasicDevice, Dict[str, Tuple[Any, Any]]], Any]) -> None:
+        """
+        Register a callback called with the device and the changed fields (field -> (old value, new value))
+        after every load_all_information() call which changed at least one tracked field.
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[BasicDevice, Dict[str, Tuple[Any, Any]]], Any]) -> None:
+        self._change_listeners.remove(listener)
 
+    def _notify_changes(self, before: Dict[str, Any]) -> None:
+        after = self.get_tracked_fields()
+        self._last_changes = {field: (before[field], value) for field, value in after.items()
+                              if before[field] != value}
+        if not self._last_changes:
+            return
+
+        self._logger.debug("Changed fields of %s: %s", self._host, self._last_changes)
+        for listener in self._change_listeners:
+            try:
+                listener(self, self._last_changes)
+            except Exception:
+                self._logger.exception("Error in change listener of %s", self._host)
+
+    async def _load_all_information(self) -> bool:
+        """For the basic device forward the call to load_device_information()"""
+        return await self.load_device_information()
+
+    async def load_device_information(self) -> bool:
+        """
+        Load device status information by calling the corresponding API endpoint. The static device identity
+        (model description and device type) is only loaded on the first call or after it was invalidated.
+        """
+        try:
+            return await self._load_part(DATA_STATUS, self._fetch_device_information)
         except DeviceError as e:
             self._error_code = e.error_code
             self._error_message = e.message
             self._error_exception = e
             return False
 
+    async def _fetch_device_information(self) -> bool:
+        """Like load_device_information(), but raises DeviceError"""
+        self._logger.info("Loading device information for %s", self._host)
+        status_url = self.get_command_url(ENDPOINT_AI, COMMAND_GET_STATUS)
+
+        # Skip parsing the status if the response did not change since the last call
+        identity_results = None
+        if self._identity_loaded:
+            status_json = await self.make_vzug_device_call_json_if_changed(status_url, COMMAND_GET_STATUS)
+            if status_json is not None and status_json.get('deviceUuid') != self.uuid:
+                self._logger.info("Device uuid of %s changed from %s to %s, reloading device identity",
+                                  self._host, self.uuid, status_json['deviceUuid'])
+                self.invalidate_identity()
+        else:
+            # Status and identity calls are independent, load them concurrently
+            status_json, *identity_results = await self._gather_calls(
+                self.make_vzug_device_call_json_if_changed(status_url, COMMAND_GET_STATUS),
+                *self._identity_calls())
+            status_json = unwrap_call_result(status_json)
+
+        self._error_code = ""
+        if status_json is not None:
+            self._apply_status_json(status_json)
+
+        if not self._identity_loaded:
+            if identity_results is None:
+                identity_results = await self._gather_calls(*self._identity_calls())
+
+            model_desc, device_type_short = identity_results
+            try:
+                self._model_desc = unwrap_call_result(model_desc)
+                self._device_type_short = unwrap_call_result(device_type_short)
+            except DeviceError as e:
+                self._record_failure(DATA_IDENTITY, e)
+                raise
+            self._set_device_type()
+            self._identity_loaded = True
+            self._record_success(DATA_IDENTITY)
+
+        self._device_information_loaded = True
+
+        self._logger.info("Got device information. Type: %s, model: %s, serial: %s, uuid: %s, name: %s, status: %s",
+                          self.device_type, self.model_desc, self.serial, self.uuid, self.device_name, self.status)
+        return True
+
+    def _apply_status_json(self, status_json: Dict[str, Any]) -> None:
+        """Replace the device status by the given getDeviceStatus response"""
+        was_active = self._device_status.is_active
+        self._device_status = self._parse_response(self.STATUS_SCHEMA, status_json, COMMAND_GET_STATUS,
+                                                   status_json=status_json if self._retain_raw_json else None)
+        if was_active and not self._device_status.is_active and self.INVALIDATE_WHEN_INACTIVE:
+            self._logger.debug("Program of %s ended, invalidating %s", self._host, self.INVALIDATE_WHEN_INACTIVE)
+            self.invalidate_data(*self.INVALIDATE_WHEN_INACTIVE)
+
+    def _parse_response(self, schema: ResponseSchema, response: Any, response_key: Optional[str] = None,
+                        **extra: Any) -> Any:
+        """
+        Parse the given response into a snapshot, raise DeviceResponseError if it does not match the schema.
+        A response that fails to parse is forgotten under its key (see make_vzug_device_call_json_if_changed()),
+        so the next identical response is parsed again instead of being skipped as unchanged.
+        """
+        try:
+            return schema.parse(response, **extra)
+        except ValueError as e:
+            if response_key is not None:
+                self._response_digests.pop(response_key, None)
+            err_msg = "Got invalid response from device"
+            self._logger.error("%s: %s", err_msg, str(e))
+            raise DeviceResponseError(err_msg, "n/a", e)
+
+    def _identity_calls(self) -> List[Awaitable[str]]:
+        """Calls loading the static device identity: model description and short device type"""
+        return [self.make_vzug_device_call_raw(self.get_command_url(ENDPOINT_AI, COMMAND_GET_MODEL_DESC)),
+                self.make_vzug_device_call_raw(self.get_command_url(ENDPOINT_HH, COMMAND_GET_MACHINE_TYPE))]
+
+    def invalidate_identity(self) -> None:
+        """Forget the cached device identity so the next load_device_information() call fetches it again"""
+        self._identity_loaded = False
+        self.invalidate_data()
+
+    def invalidate_data(self, *data: str) -> None:
+        """Reload the given semi-static data (all if none given) on the next load_all_information() call"""
+        if data:
+            for name in data:
+                self._data_loaded_at.pop(name, None)
+        else:
+            self._data_loaded_at.clear()
+
+    def is_data_due(self, data: str) -> bool:
+        """Whether the given semi-static data was not loaded yet, was invalidated or is older than its interval"""
+        loaded_at = self._data_loaded_at.get(data)
+        if loaded_at is None:
+            return True
+
+        interval = self.refresh_intervals.get(data)
+        return interval is not None and time.monotonic() - loaded_at >= interval
+
+    async def _load_part(self, part: str, loader: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Run the loader of the given part and record its outcome (also for the parts covered by it)"""
+        try:
+            result = await loader(*args)
+        except DeviceError as e:
+            self._record_failure(part, e)
+            raise
+
+        self._record_success(part)
+        return result
+
+    def _record_success(self, part: str) -> None:
+        now = time.monotonic()
+        for name in (part, *self.PART_COVERS.get(part, ())):
+            self._components[name] = self.component_status(name)._replace(last_success=now)
+            self._data_loaded_at[name] = now
+
+    def _record_failure(self, part: str, error: BaseException) -> None:
+        now = time.monotonic()
+        for name in (part, *self.PART_COVERS.get(part, ())):
+            self._components[name] = self.component_status(name)._replace(last_failure=now, last_error=error)
+
+    def component_status(self, component: str) -> ComponentStatus:
+        """Outcome of the loads of the given component (e.g. DATA_CONSUMPTION) of the device data"""
+        return self._components.get(component, EMPTY_COMPONENT_STATUS)
+
+    @property
+    def components(self) -> Dict[str, ComponentStatus]:
+        """Outcome of the loads of all components loaded or attempted so far (component -> status)"""
+        return dict(self._components)
+
+    @property
+    def failed_parts(self) -> List[str]:
+        """Parts whose last load failed, e.g. to retry only them with refresh(parts=device.failed_parts)"""
+        return [part for part in self._part_loaders() if self.component_status(part).failed]
+
     def _set_device_type(self) -> None:
         if self._device_type_short in DEVICE_TYPE_MAPPING:
             self._device_type = DEVICE_TYPE_MAPPING.get(self._device_type_short)
@@ -216,15 +733,75 @@ class BasicDevice:
             return eco_json[CONSUMPTION_DETAILS_VALUE]
         else:
             self._logger.error('Error reading consumption data, no \'value\' entry found in response.')
-            raise DeviceError('Got invalid response while reading consumption data.', 'n/a')
+            raise DeviceResponseError('Got invalid response while reading consumption data.', 'n/a')
+
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def session(self) -> Optional[aiohttp.ClientSession]:
+        return self._session
+
+    @property
+    def owns_session(self) -> bool:
+        return self._owns_session
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, retry_policy: RetryPolicy) -> None:
+        self._retry_policy = retry_policy
+
+    @property
+    def retain_raw_json(self) -> bool:
+        """
+        If False only the parsed fields of the getDeviceStatus response are kept and status_json is empty,
+        which saves memory in large fleets
+        """
+        return self._retain_raw_json
+
+    @retain_raw_json.setter
+    def retain_raw_json(self, retain_raw_json: bool) -> None:
+        self._retain_raw_json = retain_raw_json
+        if not retain_raw_json:
+            self._device_status = self._device_status._replace(status_json=None)
+
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: aiohttp.ClientTimeout) -> None:
+        self._timeout = timeout
+
+    @property
+    def host_state(self) -> HostState:
+        return self._host_state
+
+    @property
+    def auth_state(self) -> Dict[str, Any]:
+        """Digest auth challenge state; persist it and pass it to the constructor to skip the first 401"""
+        return self._host_state.auth.state
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        return self._circuit_breaker
+
+    @property
+    def device_status(self) -> DeviceStatus:
+        """Snapshot of the last device status, replaced as a whole by every refresh"""
+        return self._device_status
 
     @property
     def serial(self) -> str:
-        return self._serial
+        return self._device_status.serial
 
     @property
     def device_name(self) -> str:
-        return self._device_name
+        return self._device_status.device_name
 
     @property
     def model_desc(self) -> str:
@@ -232,19 +809,20 @@ class BasicDevice:
 
     @property
     def status(self) -> str:
-        return self._status
+        return self._device_status.status
 
     @property
     def status_json(self) -> Any:
-        return self._status_json
+        status_json = self._device_status.status_json
+        return {} if status_json is None else status_json
 
     @property
     def is_active(self) -> bool:
-        return self._active
+        return self._device_status.is_active
 
     @property
     def program(self) -> str:
-        return self._program
+        return self._device_status.program
 
     @property
     def error_code(self) -> str:
@@ -258,14 +836,23 @@ class BasicDevice:
     def error_exception(self) -> Optional[DeviceError]:
         return self._error_exception
 
+    @property
+    def last_changes(self) -> Dict[str, Tuple[Any, Any]]:
+        """Fields changed by the last load_all_information() call (field -> (old value, new value))"""
+        return self._last_changes
+
     @property
     def device_information_loaded(self) -> bool:
         return self._device_information_loaded
 
+    @property
+    def identity_loaded(self) -> bool:
+        return self._identity_loaded
+
     @property
     def device_type(self) -> Optional[str]:
         return self._device_type
 
     @property
     def uuid(self) -> str:
-        return self._uuid
+        return self._device_status.uuid
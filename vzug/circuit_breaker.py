@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import time
+
+from typing import Optional
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one host. After failure_threshold consecutive transport failures (timeouts, refused
+    connections) the circuit opens and calls fail fast with the last error. After reset_timeout seconds the
+    circuit is half-open: a single probe call is let through, which closes the circuit on success or opens
+    it again on failure.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._open = False
+        self._opened_at = 0.0
+        self._probe_in_progress = False
+        self._consecutive_failures = 0
+        self._total_failures = 0
+        self._total_successes = 0
+        self._rejected_calls = 0
+        self._times_opened = 0
+        self._last_error: Optional[Exception] = None
+
+    def __repr__(self) -> str:
+        return (f"CircuitBreaker(state={self.state}, consecutive_failures={self._consecutive_failures}, "
+                f"rejected_calls={self._rejected_calls})")
+
+    @property
+    def state(self) -> str:
+        if not self._open:
+            return STATE_CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return STATE_HALF_OPEN
+        return STATE_OPEN
+
+    @property
+    def is_closed(self) -> bool:
+        return not self._open
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until the circuit becomes half-open (0 if it is not open)"""
+        if not self._open:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def try_acquire_probe(self) -> bool:
+        """Return True if the caller may send the probe call of the half-open circuit"""
+        if self.state != STATE_HALF_OPEN or self._probe_in_progress:
+            return False
+        self._probe_in_progress = True
+        return True
+
+    def release_probe(self) -> None:
+        """Release the probe slot without a result, e.g. if the probe call was cancelled"""
+        self._probe_in_progress = False
+
+    def record_success(self) -> None:
+        self._total_successes += 1
+        self._consecutive_failures = 0
+        self._probe_in_progress = False
+        self._open = False
+
+    def record_failure(self, error: Exception) -> None:
+        self._total_failures += 1
+        self._consecutive_failures += 1
+        self._last_error = error
+
+        # A failed probe opens the circuit again at once
+        if self._probe_in_progress or self._consecutive_failures >= self.failure_threshold:
+            if not self._open:
+                self._times_opened += 1
+            self._open = True
+            self._opened_at = time.monotonic()
+        self._probe_in_progress = False
+
+    def record_rejected(self) -> None:
+        self._rejected_calls += 1
+
+    def reset(self) -> None:
+        """Close the circuit, e.g. after the device was switched on again"""
+        self._open = False
+        self._probe_in_progress = False
+        self._consecutive_failures = 0
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._consecutive_failures
+
+    @property
+    def total_failures(self) -> int:
+        return self._total_failures
+
+    @property
+    def total_successes(self) -> int:
+        return self._total_successes
+
+    @property
+    def rejected_calls(self) -> int:
+        return self._rejected_calls
+
+    @property
+    def times_opened(self) -> int:
+        return self._times_opened
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        return self._last_error
@@ -10,6 +10,14 @@ COMMAND_GET_MACHINE_TYPE = 'getMachineType'
 COMMAND_GET_PROGRAM = 'getProgram'
 COMMAND_GET_COMMAND = 'getCommand'
 
+# Parts of the device data loaded by BasicDevice.refresh(), the identity is loaded with the status. Consumption
+# and optiDos data are semi-static and refreshed with their own cadence by load_all_information() (see
+# BasicDevice.refresh_intervals)
+DATA_IDENTITY = 'identity'
+DATA_STATUS = 'status'
+DATA_PROGRAM = 'program'
+DATA_CONSUMPTION = 'consumption'
+DATA_OPTIDOS = 'optidos'
 
 DEVICE_TYPE_UNKNOWN = 'UNKNOWN'
 DEVICE_TYPE_WASHING_MACHINE = 'WASHING_MACHINE'
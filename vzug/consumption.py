@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import re
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Units of the consumption values sent by the devices (e.g. " 29 kWh,  2119ℓ ") -> (field, divisor)
+CONSUMPTION_UNITS: Dict[str, Tuple[str, int]] = {
+    'kWh': ('kwh', 1),
+    'Wh': ('kwh', 1000),
+    'ℓ': ('liter', 1),
+    'l': ('liter', 1),
+    'L': ('liter', 1),
+}
+
+# Thousands separators which are never used as decimal separator (Swiss apostrophe, no-break spaces)
+_GROUPING_CHARS = str.maketrans('', '', "'\u2019\u00a0\u202f")
+
+# A number (digits with optional decimal / thousands separators) directly followed by a known unit
+REGEX_CONSUMPTION_VALUE = re.compile(
+    r"(\d(?:[\d.,'\u2019\u00a0\u202f]*\d)?)\s?(" +
+    '|'.join(re.escape(unit) for unit in sorted(CONSUMPTION_UNITS, key=len, reverse=True)) +
+    r")(?![^\W\d_])")
+
+
+class ConsumptionValues(NamedTuple):
+    """Values of a consumption string, None for units not contained in the string"""
+    kwh: Optional[float] = None
+    liter: Optional[float] = None
+
+
+# Unit -> (index of the field in ConsumptionValues, divisor)
+_UNIT_INDEXES = {unit: (ConsumptionValues._fields.index(field), divisor)
+                 for unit, (field, divisor) in CONSUMPTION_UNITS.items()}
+
+
+def parse_number(number: str, decimal_separator: Optional[str] = None) -> float:
+    """
+    Convert a number with decimal and thousands separators to float. If no decimal separator ('.' or ',') is
+    given, a separator appearing once is taken as decimal separator, e.g. '0,7' and '0.7' (that's what the
+    devices send), and if both appear, the last one (e.g. '1.234,5' and '1,234.5').
+    """
+    if decimal_separator is None:
+        try:
+            # Fast path for plain numbers like '2119' and '0.7'
+            return float(number)
+        except ValueError:
+            pass
+
+    number = number.translate(_GROUPING_CHARS)
+    if decimal_separator is None:
+        last = max(number.rfind('.'), number.rfind(','))
+        if last < 0:
+            return float(number)
+
+        decimal_separator = number[last]
+        if number.count(decimal_separator) > 1:
+            # Repeated separator, e.g. '1.234.567': thousands separator only
+            return float(number.replace(decimal_separator, ''))
+
+    grouping_separator = ',' if decimal_separator == '.' else '.'
+    return float(number.replace(grouping_separator, '').replace(decimal_separator, '.'))
+
+
+def parse_consumption(value_str: str, decimal_separator: Optional[str] = None) -> ConsumptionValues:
+    """Extract all values with a known unit from the given consumption string in a single pass"""
+    values: List[Optional[float]] = [None, None]
+    for number, unit in REGEX_CONSUMPTION_VALUE.findall(value_str):
+        index, divisor = _UNIT_INDEXES[unit]
+        # First value of a unit wins, like the former per unit search
+        if values[index] is None:
+            values[index] = parse_number(number, decimal_separator) / divisor
+
+    return ConsumptionValues(*values)
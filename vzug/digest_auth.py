@@ -1,4 +1,8 @@
+import re
+import asyncio
 import hashlib
+import functools
+import threading
 import time
 import os
 
@@ -6,13 +10,26 @@ from aiohttp import client_exceptions, hdrs
 from yarl import URL
 
 
+# Nonce counts are kept for this many nonces, requests still using an older
+# challenge (while the nonce changed) continue their counts.
+MAX_TRACKED_NONCES = 4
+
+
 class DigestAuth:
     """HTTP digest authentication helper.
     The work here is based off of
     https://github.com/requests/requests/blob/v2.18.4/requests/auth.py.
+
+    An instance is meant to be long-lived (one per host and credentials): the last challenge is reused to
+    send the Authorization header preemptively and HA1 is computed once per realm and algorithm. The 401
+    round trip is only needed for the first request, a stale nonce or a rejected header.
+
+    Concurrent requests are safe: the headers passed in are copied per request, every request builds its
+    header from one snapshot of the challenge and nonce counts are allocated atomically, so no count is
+    used twice under the same nonce.
     """
 
-    def __init__(self, username, password, session, previous=None):
+    def __init__(self, username, password, session=None, previous=None):
         if previous is None:
             previous = {}
 
@@ -21,51 +38,141 @@ class DigestAuth:
         self.last_nonce = previous.get('last_nonce', '')
         self.nonce_count = previous.get('nonce_count', 0)
         self.challenge = previous.get('challenge')
-        self.args = {}
-        self.digest_auth_tried = False
         self.session = session
+        self._ha1_cache = {}
+        self._challenge_waiter = None
+        # nonce -> last allocated count, for the most recent nonces only
+        self._nonce_counts = {}
+        if self.last_nonce:
+            self._nonce_counts[self.last_nonce] = self.nonce_count
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Challenge state, can be persisted and passed as previous to skip the first 401 round trip"""
+        with self._lock:
+            return {
+                'nonce_count': self.nonce_count,
+                'last_nonce': self.last_nonce,
+                'challenge': self.challenge,
+            }
 
     async def request(self, method, url, *, headers=None, **kwargs):
-        if headers is None:
-            headers = {}
-
-        # Save the args so we can re-run the request
-        self.args = {
-            'method': method,
-            'url': url,
-            'headers': headers,
-            'kwargs': kwargs
-        }
-
-        if self.challenge:
+        response, _ = await self.send(self.session, method, url,
+                                      headers=headers, **kwargs)
+        return response
+
+    async def send(self, session, method, url, *, headers=None, **kwargs):
+        """
+        Send the request with the given session. Return the response and
+        whether a challenge round trip was needed.
+        """
+        # Never modify the headers of the caller, they may be shared
+        headers = dict(headers) if headers else {}
+
+        loop = asyncio.get_running_loop()
+        waiter = self._challenge_waiter
+        if self.challenge is None and waiter is not None and \
+                waiter.get_loop() is loop:
+            # Another request is fetching the first challenge, wait for it
+            # instead of provoking one 401 per concurrent request.
+            await asyncio.shield(waiter)
+            waiter = None
+        elif self.challenge is None and self.username:
+            waiter = loop.create_future()
+            self._challenge_waiter = waiter
+        else:
+            waiter = None
+
+        try:
+            return await self._send(session, method, url, headers, kwargs)
+        finally:
+            if waiter is not None:
+                waiter.set_result(None)
+                if self._challenge_waiter is waiter:
+                    self._challenge_waiter = None
+
+    async def _send(self, session, method, url, headers, kwargs):
+        challenge = self.challenge
+        if challenge:
             headers[hdrs.AUTHORIZATION] = self._build_digest_header(
-                method.upper(), url
+                method.upper(), url, challenge
             )
 
-        response = await self.session.request(
+        response = await session.request(
             method, url, headers=headers, **kwargs
         )
 
         # Only try performing digest authentication if the response status is
         # from 400 to 500.
-        if 400 <= response.status < 500 and self.digest_auth_tried is False:
-            self.digest_auth_tried = True
-            return await self._handle_401(response)
-
-        return response
+        if not 400 <= response.status < 500:
+            return response, False
+
+        challenge = self._parse_challenge(response)
+        if challenge is None:
+            return response, False
+
+        # No challenge was known, the nonce is stale or the header was
+        # rejected: retry once with the new challenge. Other requests may
+        # replace self.challenge meanwhile, so the local copy is used.
+        self.challenge = challenge
+        await self._release(response)
+        headers[hdrs.AUTHORIZATION] = self._build_digest_header(
+            method.upper(), url, challenge
+        )
+        response = await session.request(
+            method, url, headers=headers, **kwargs
+        )
+        return response, True
 
-    def _build_digest_header(self, method, url):
+    @staticmethod
+    async def _release(response):
+        """
+        Read the (small) body of an intermediate response and release it, so
+        the keep-alive connection goes back to the pool and can be used for
+        the authenticated retry.
+        """
+        try:
+            await response.read()
+        finally:
+            response.release()
+
+    def _get_ha1(self, realm, algorithm, hash_fn):
+        """HA1 only depends on the credentials, realm and algorithm"""
+        key = (realm, algorithm)
+        ha1 = self._ha1_cache.get(key)
+        if ha1 is None:
+            a1 = '%s:%s:%s' % (self.username, realm, self.password)
+            ha1 = hash_fn(a1.encode()).hexdigest()
+            self._ha1_cache[key] = ha1
+        return ha1
+
+    def _next_nonce_count(self, nonce):
+        """Allocate the next count for the given nonce, each count is only returned once"""
+        with self._lock:
+            nonce_count = self._nonce_counts.pop(nonce, 0) + 1
+            self._nonce_counts[nonce] = nonce_count
+            if len(self._nonce_counts) > MAX_TRACKED_NONCES:
+                del self._nonce_counts[next(iter(self._nonce_counts))]
+
+            self.last_nonce = nonce
+            self.nonce_count = nonce_count
+            return nonce_count
+
+    def _build_digest_header(self, method, url, challenge=None):
         """
         :rtype: str
         """
+        if challenge is None:
+            challenge = self.challenge
 
-        realm = self.challenge['realm']
-        nonce = self.challenge['nonce']
-        qop = self.challenge.get('qop')
-        algorithm = self.challenge.get('algorithm', 'MD5').upper()
-        opaque = self.challenge.get('opaque')
+        realm = challenge['realm']
+        nonce = challenge['nonce']
+        qop = challenge.get('qop')
+        algorithm = challenge.get('algorithm', 'MD5').upper()
+        opaque = challenge.get('opaque')
 
-        if qop and not (qop == 'auth' or 'auth' in qop.split(',')):
+        if qop and 'auth' not in [value.strip() for value in qop.split(',')]:
             raise client_exceptions.ClientError(
                 'Unsupported qop value: %s' % qop
             )
@@ -85,24 +192,17 @@ class DigestAuth:
             return H('%s:%s' % (s, d))
 
         path = URL(url).path_qs
-        A1 = '%s:%s:%s' % (self.username, realm, self.password)
         A2 = '%s:%s' % (method, path)
 
-        HA1 = H(A1)
+        HA1 = self._get_ha1(realm, algorithm, hash_fn)
         HA2 = H(A2)
 
-        if nonce == self.last_nonce:
-            self.nonce_count += 1
-        else:
-            self.nonce_count = 1
-
-        self.last_nonce = nonce
-
-        ncvalue = '%08x' % self.nonce_count
+        nonce_count = self._next_nonce_count(nonce)
+        ncvalue = '%08x' % nonce_count
 
         # cnonce is just a random string generated by the client.
         cnonce_data = ''.join([
-            str(self.nonce_count),
+            str(nonce_count),
             nonce,
             time.ctime(),
             os.urandom(8).decode(errors='ignore'),
@@ -137,43 +237,58 @@ class DigestAuth:
 
         return 'Digest %s' % base
 
-    async def _handle_401(self, response):
+    @staticmethod
+    def _parse_challenge(response):
         """
-        Takes the given response and tries digest-auth, if needed.
-        :rtype: ClientResponse
+        Return the digest challenge of the given response or None.
+        :rtype: dict
         """
-        auth_header = response.headers.get('WWW-Authenticate', '')
+        return parse_digest_challenge(
+            response.headers.get('WWW-Authenticate', '')
+        )
 
-        parts = auth_header.split(' ', 1)
-        if 'digest' == parts[0].lower() and len(parts) > 1:
-            self.challenge = parse_key_value_list(parts[1])
 
-            return await self.request(
-                self.args['method'],
-                self.args['url'],
-                headers=self.args['headers'],
-                **self.args['kwargs']
-            )
+# auth-param of RFC 7616 / 7235: token = ( token / quoted-string )
+REGEX_AUTH_PARAM = re.compile(
+    r'([!#$%&\'*+\-.^_`|~0-9A-Za-z]+)\s*=\s*'
+    r'(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s,"]*))'
+)
+REGEX_QUOTED_PAIR = re.compile(r'\\(.)')
 
-        return response
 
+def parse_key_value_list(header):
+    """
+    Parse the auth-params of a challenge in a single pass. Quoted values may
+    contain commas (qop="auth,auth-int") and escaped characters, parameter
+    names are case-insensitive and returned in lower case. Malformed
+    parameters are skipped.
+    :rtype: dict
+    """
+    params = {}
+    for key, quoted, token in REGEX_AUTH_PARAM.findall(header):
+        if '\\' in quoted:
+            quoted = REGEX_QUOTED_PAIR.sub(r'\1', quoted)
+        params[key.lower()] = quoted or token
 
-def parse_pair(pair):
-    key, value = pair.split('=', 1)
+    return params
 
-    # If it has a trailing comma, remove it.
-    if value[-1] == ',':
-        value = value[:-1]
 
-    # If it is quoted, then remove them.
-    if value[0] == value[-1] == '"':
-        value = value[1:-1]
+@functools.lru_cache(maxsize=32)
+def _parse_digest_challenge(header):
+    parts = header.strip().split(None, 1)
+    if len(parts) > 1 and 'digest' == parts[0].lower():
+        return tuple(parse_key_value_list(parts[1]).items())
 
-    return str(key).strip(), str(value).strip()
+    return None
 
 
-def parse_key_value_list(header):
-    return {
-        key: value for key, value in
-        [parse_pair(header_pair) for header_pair in header.split(',')]
-    }
+def parse_digest_challenge(header):
+    """
+    Return the parameters of a digest challenge (WWW-Authenticate header) or
+    None for other schemes. Appliances send the same challenge again and
+    again, so parsed headers are cached.
+    :rtype: dict
+    """
+    params = _parse_digest_challenge(header)
+    # A new dict every time, the challenge is stored and may be modified
+    return None if params is None else dict(params)
@@ -1,8 +1,14 @@
+import math
+import time
 import locale
 
 from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
 from .basic_device import BasicDevice, DeviceError, read_kwh_from_string
-from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM
+from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM, DATA_PROGRAM
+from .schema import (Field, ResponseSchema, to_bool, ACTIVE_PROGRAM_SCHEMA, PROGRAM_NAME_FIELD, PROGRAM_STATUS_FIELD,
+                     PROGRAM_STATUS_SCHEMA)
+from .state import DEFAULT_MAX_PROGRAM_STATE_AGE, ProgramState, EMPTY_PROGRAM_STATE
 
 locale.setlocale(locale.LC_ALL, '')  # Use '' for auto, or force e.g. to 'en_US.UTF-8'
 
@@ -22,41 +28,50 @@ PROGRAM_INFORMATION_SET = 'set'
 PROGRAM_STARTTIME = 'starttime'
 PROGRAM_STARTTIME_SET = 'set'
 
-REGEX_MATCH_LITER = r"(\d+(?:[\,\.]\d+)?).?ℓ"
-REGEX_MATCH_KWH = r"(\d+(?:[\,\.]\d+)?).?kWh"
+PROGRAM_OPTION_FIELDS = (
+    Field('is_energy_saving', (PROGRAM_ENERGY_SAVING, PROGRAM_INFORMATION_SET), converter=to_bool),
+    Field('is_opti_start', (PROGRAM_OPTI_START, PROGRAM_INFORMATION_SET), converter=to_bool),
+    Field('is_partialload', (PROGRAM_PARTIALLOAD, PROGRAM_INFORMATION_SET), converter=to_bool),
+    Field('is_rinse_plus', (PROGRAM_RINSE_PLUS, PROGRAM_INFORMATION_SET), converter=to_bool),
+    Field('is_dry_plus', (PROGRAM_DRY_PLUS, PROGRAM_INFORMATION_SET), converter=to_bool),
+)
 
 
 class Dishwasher(BasicDevice):
     """Class representing V-Zug dishwashers"""
 
-    def __init__(self, host: str, username: str = "", password: str = ""):
-        super().__init__(host, username, password)
-        self._seconds_to_end = 0
-        self._seconds_to_start = 0
-        self._program_duration = 0
-        self._program_name = ""
-        self._program_status = ""
-        self._is_energy_saving = False
-        self._is_opti_start = False
-        self._is_partialload = False
-        self._is_rinse_plus = False
-        self._is_dry_plus = False
-
-    def _reset_active_program_information(self) -> None:
-        self._seconds_to_end = 0
-        self._seconds_to_start = 0
-        self._program_duration = 0
-        self._program_name = ""
-        self._program_status = ""
-        self._is_energy_saving = False
-        self._is_opti_start = False
-        self._is_partialload = False
-        self._is_rinse_plus = False
-        self._is_dry_plus = False
-        
-    async def load_all_information(self) -> bool:
+    TRACKED_FIELDS = BasicDevice.TRACKED_FIELDS + (
+        'program_status', 'program_name', 'seconds_to_end', 'seconds_to_start', 'program_duration',
+        'is_energy_saving', 'is_opti_start', 'is_partialload', 'is_rinse_plus', 'is_dry_plus')
+
+    FIELD_PARTS = {
+        **BasicDevice.FIELD_PARTS,
+        **dict.fromkeys(
+            ('program_state', 'program_status', 'program_name', 'seconds_to_end', 'seconds_to_start',
+             'program_duration', 'date_time_end', 'date_time_start', 'program_refresh_due_in',
+             'is_program_state_stale', 'is_energy_saving', 'is_opti_start', 'is_partialload', 'is_rinse_plus',
+             'is_dry_plus'), DATA_PROGRAM),
+    }
+
+    # Age after which the program state should be refreshed even if no countdown ran out
+    max_program_state_age: float = DEFAULT_MAX_PROGRAM_STATE_AGE
+
+    PROGRAM_STATUS_SCHEMA = PROGRAM_STATUS_SCHEMA
+    PROGRAM_SCHEMA = ResponseSchema(ProgramState, *ACTIVE_PROGRAM_SCHEMA.fields, *PROGRAM_OPTION_FIELDS)
+    # Program waiting for its start time: no remaining time yet, but the set duration and start time
+    TIMED_PROGRAM_SCHEMA = ResponseSchema(
+        ProgramState, PROGRAM_STATUS_FIELD, PROGRAM_NAME_FIELD,
+        Field('duration', (PROGRAM_DURATION, PROGRAM_DURATION_SET)),
+        Field('seconds_to_start', (PROGRAM_STARTTIME, PROGRAM_STARTTIME_SET)),
+        *PROGRAM_OPTION_FIELDS)
+
+    def __init__(self, host: str, username: str = "", password: str = "", **kwargs: Any):
+        super().__init__(host, username, password, **kwargs)
+        self._program_state = EMPTY_PROGRAM_STATE
+
+    async def _load_all_information(self) -> bool:
         """Load consumption data and if a program is active load also the program details"""
-        loaded = await super().load_all_information()
+        loaded = await super()._load_all_information()
         if loaded:
             
             if loaded and self.is_active:
@@ -65,97 +80,131 @@ class Dishwasher(BasicDevice):
         return loaded
 
     async def load_program_details(self) -> bool:
-        """Load program details information by calling the corresponding API endpoint"""
+        """
+        Load program details information by calling the corresponding API endpoint. If the response did
+        not change since the last call it is not parsed again.
+        """
+        try:
+            return await self._load_part(DATA_PROGRAM, self._fetch_program_details)
+        except DeviceError as e:
+            self._error_code = e.error_code
+            self._error_message = e.message
+            self._error_exception = e
+            return False
 
+    async def _fetch_program_details(self) -> bool:
+        """Like load_program_details(), but raises DeviceError"""
         self._logger.info("Loading program information for %s", self._host)
 
-        self._reset_active_program_information()
+        program_resp = await self.make_vzug_device_call_json_if_changed(
+            self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM), COMMAND_GET_PROGRAM)
+        fetched_at = time.monotonic()
 
-        try:
-            program_json = (await self.make_vzug_device_call_json(
-                self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM)))[0]
+        if program_resp is None:
+            self._logger.info("Program information did not change")
+            self._program_state = self._program_state._replace(fetched_at=fetched_at)
+            return PROGRAM_STATUS_IDLE not in self.program_status
 
-            self._program_status = program_json[PROGRAM_STATUS]
-            
-            if PROGRAM_STATUS_IDLE in self._program_status:
-                self._logger.info("No program information available because no program is active")
-                return False
+        program_json = program_resp[0]
+        program_state = self._parse_response(self.PROGRAM_STATUS_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                             fetched_at=fetched_at)
 
-            if PROGRAM_STATUS_TIMED in self._program_status:
-                self._program_duration = program_json[PROGRAM_DURATION][PROGRAM_DURATION_SET]
-                self._seconds_to_start = program_json[PROGRAM_STARTTIME][PROGRAM_STARTTIME_SET]
-                self._seconds_to_end = self._seconds_to_start + self._program_duration
-            else:
-                self._seconds_to_end = program_json[PROGRAM_DURATION][PROGRAM_DURATION_ACT]
+        if PROGRAM_STATUS_IDLE in program_state.status:
+            self._program_state = program_state
+            self._logger.info("No program information available because no program is active")
+            return False
 
-            self._program_name = program_json[PROGRAM_NAME]
-            self._is_energy_saving = program_json[PROGRAM_ENERGY_SAVING][PROGRAM_INFORMATION_SET]
-            self._is_opti_start = program_json[PROGRAM_OPTI_START][PROGRAM_INFORMATION_SET]
-            self._is_partialload = program_json[PROGRAM_PARTIALLOAD][PROGRAM_INFORMATION_SET]
-            self._is_rinse_plus = program_json[PROGRAM_RINSE_PLUS][PROGRAM_INFORMATION_SET]
-            self._is_dry_plus = program_json[PROGRAM_DRY_PLUS][PROGRAM_INFORMATION_SET]
+        if PROGRAM_STATUS_TIMED in program_state.status:
+            program_state = self._parse_response(self.TIMED_PROGRAM_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                                 fetched_at=fetched_at)
+            self._program_state = program_state._replace(
+                seconds_to_end=program_state.seconds_to_start + program_state.duration)
+        else:
+            self._program_state = self._parse_response(self.PROGRAM_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                                       fetched_at=fetched_at)
 
-            self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
-                              self.program_name, self.seconds_to_end / 60, self.date_time_end)
+        self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
+                          self.program_name, self.seconds_to_end / 60, self.date_time_end)
 
-            return True
+        return True
 
-        except DeviceError as e:
-            self._error_code = e.error_code
-            self._error_message = e.message
-            self._error_exception = e
-            return False
+    @property
+    def program_state(self) -> ProgramState:
+        return self._program_state
 
     @property
     def program_status(self) -> str:
-        return self._program_status
+        return self._program_state.status
 
     @property
     def program_name(self) -> str:
-        return self._program_name
+        return self._program_state.name
 
     @property
     def is_energy_saving(self) -> bool:
-        return self._is_energy_saving
+        return self._program_state.is_energy_saving
 
     @property
     def is_opti_start(self) -> bool:
-        return self._is_opti_start
+        return self._program_state.is_opti_start
 
     @property
     def is_partialload(self) -> bool:
-        return self._is_partialload
+        return self._program_state.is_partialload
 
     @property
     def is_rinse_plus(self) -> bool:
-        return self._is_rinse_plus
+        return self._program_state.is_rinse_plus
 
     @property
     def is_dry_plus(self) -> bool:
-        return self._is_dry_plus
+        return self._program_state.is_dry_plus
 
     @property
     def seconds_to_end(self) -> int:
-        return self._seconds_to_end
+        """Remaining seconds of the program, counted down since the program state was fetched"""
+        return math.ceil(self._program_state.remaining(self._program_state.seconds_to_end))
 
     @property
     def seconds_to_start(self) -> int:
-        return self._seconds_to_start
+        """Seconds to the start of a timed program, counted down since the program state was fetched"""
+        return math.ceil(self._program_state.remaining(self._program_state.seconds_to_start))
 
     @property
     def program_duration(self) -> int:
-        return self._program_duration
+        return self._program_state.duration
 
     @property
     def date_time_end(self) -> datetime:
-        return datetime.now() + timedelta(seconds=self.seconds_to_end)
+        return self.get_date_time_end()
 
     @property
     def date_time_start(self) -> datetime:
-        return datetime.now() + timedelta(seconds=self.seconds_to_start)
+        return self.get_date_time_start()
 
     def get_date_time_end(self, tz=None) -> datetime:
-        return datetime.now(tz) + timedelta(seconds=self.seconds_to_end)
+        seconds_to_end = self._program_state.remaining(self._program_state.seconds_to_end)
+        return datetime.now(tz) + timedelta(seconds=seconds_to_end)
 
     def get_date_time_start(self, tz=None) -> datetime:
-        return datetime.now(tz) + timedelta(seconds=self.seconds_to_start)
+        seconds_to_start = self._program_state.remaining(self._program_state.seconds_to_start)
+        return datetime.now(tz) + timedelta(seconds=seconds_to_start)
+
+    @property
+    def program_refresh_due_in(self) -> float:
+        """Seconds until the program state must be refreshed (see ProgramState.refresh_due_in())"""
+        return self._program_state.refresh_due_in(self.max_program_state_age)
+
+    @property
+    def is_program_state_stale(self) -> bool:
+        return self.program_refresh_due_in <= 0
+
+    def _part_loaders(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        return {**super()._part_loaders(), DATA_PROGRAM: self._fetch_program_details}
+
+    def get_tracked_fields(self) -> Dict[str, Any]:
+        values = super().get_tracked_fields()
+        # Report the fetched countdowns, the extrapolated ones change without a refresh
+        values['seconds_to_end'] = self._program_state.seconds_to_end
+        values['seconds_to_start'] = self._program_state.seconds_to_start
+        return values
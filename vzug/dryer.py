@@ -1,8 +1,14 @@
+import math
+import time
 import locale
 
 from datetime import datetime, timedelta
-from .basic_device import BasicDevice, DeviceError, read_kwh_from_string
-from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM
+from typing import Any, Awaitable, Callable, Dict
+from .basic_device import BasicDevice, DeviceError, read_kwh_from_string, unwrap_call_result
+from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM, DATA_PROGRAM, DATA_CONSUMPTION
+from .schema import ACTIVE_PROGRAM_SCHEMA, PROGRAM_STATUS_SCHEMA
+from .state import (DEFAULT_MAX_PROGRAM_STATE_AGE, ConsumptionStats, ProgramState, EMPTY_PROGRAM_STATE,
+                    EMPTY_CONSUMPTION_STATS)
 
 locale.setlocale(locale.LC_ALL, '')  # Use '' for auto, or force e.g. to 'en_US.UTF-8'
 
@@ -15,83 +21,104 @@ PROGRAM_DURATION_ACT = 'act'
 PROGRAM_STATUS = 'status'
 PROGRAM_STATUS_IDLE = 'idle'
 
-REGEX_MATCH_LITER = r"(\d+(?:[\,\.]\d+)?).?ℓ"
-REGEX_MATCH_KWH = r"(\d+(?:[\,\.]\d+)?).?kWh"
-
 
 class Dryer(BasicDevice):
     """Class representing V-Zug dryers"""
 
-    def __init__(self, host: str, username: str = "", password: str = ""):
-        super().__init__(host, username, password)
-        self._seconds_to_end = 0
-        self._program_name = ""
-        self._program_status = ""
-        self._power_consumption_kwh_total = 0.0
-        self._power_consumption_kwh_avg = 0.0
-
-    def _reset_active_program_information(self) -> None:
-        self._seconds_to_end = 0
-        self._program_name = ""
-        self._program_status = ""
-        
-    async def load_all_information(self) -> bool:
-        """Load consumption data and if a program is active load also the program details"""
-        loaded = await super().load_all_information()
-        if loaded:
+    TRACKED_FIELDS = BasicDevice.TRACKED_FIELDS + (
+        'program_status', 'program_name', 'seconds_to_end', 'power_consumption_kwh_total',
+        'power_consumption_kwh_avg')
+
+    # Consumption is reloaded when a program ended
+    refresh_intervals = {DATA_CONSUMPTION: None}
+    INVALIDATE_WHEN_INACTIVE = (DATA_CONSUMPTION,)
+
+    FIELD_PARTS = {
+        **BasicDevice.FIELD_PARTS,
+        **dict.fromkeys(
+            ('program_state', 'program_status', 'program_name', 'seconds_to_end', 'date_time_end',
+             'program_refresh_due_in', 'is_program_state_stale'), DATA_PROGRAM),
+        **dict.fromkeys(('consumption_stats', 'power_consumption_kwh_total', 'power_consumption_kwh_avg'),
+                        DATA_CONSUMPTION),
+    }
+
+    # Age after which the program state should be refreshed even if no countdown ran out
+    max_program_state_age: float = DEFAULT_MAX_PROGRAM_STATE_AGE
+
+    PROGRAM_STATUS_SCHEMA = PROGRAM_STATUS_SCHEMA
+    PROGRAM_SCHEMA = ACTIVE_PROGRAM_SCHEMA
+
+    def __init__(self, host: str, username: str = "", password: str = "", **kwargs: Any):
+        super().__init__(host, username, password, **kwargs)
+        self._program_state = EMPTY_PROGRAM_STATE
+        self._consumption_stats = EMPTY_CONSUMPTION_STATS
+
+    async def _load_all_information(self) -> bool:
+        """
+        Load the program details if a program is active. Consumption data only changes when a program ends,
+        it is loaded when due (see refresh_intervals).
+        """
+        # Without the status it is unknown which parts are needed
+        if not await super()._load_all_information():
+            return False
+
+        # A failed part does not prevent loading the other parts (see failed_parts)
+        loaded = True
+        if self.is_data_due(DATA_CONSUMPTION):
             loaded = await self.load_consumption_data()
-            
-            if loaded and self.is_active:
-                loaded = await self.load_program_details()
-            
+
+        if self.is_active:
+            loaded = await self.load_program_details() and loaded
+
         return loaded
 
     async def load_program_details(self) -> bool:
-        """Load program details information by calling the corresponding API endpoint"""
+        """
+        Load program details information by calling the corresponding API endpoint. If the response did
+        not change since the last call it is not parsed again.
+        """
+        try:
+            return await self._load_part(DATA_PROGRAM, self._fetch_program_details)
+        except DeviceError as e:
+            self._error_code = e.error_code
+            self._error_message = e.message
+            self._error_exception = e
+            return False
 
+    async def _fetch_program_details(self) -> bool:
+        """Like load_program_details(), but raises DeviceError"""
         self._logger.info("Loading program information for %s", self._host)
 
-        self._reset_active_program_information()
+        program_resp = await self.make_vzug_device_call_json_if_changed(
+            self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM), COMMAND_GET_PROGRAM)
+        fetched_at = time.monotonic()
 
-        try:
-            program_json = (await self.make_vzug_device_call_json(
-                self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM)))[0]
+        if program_resp is None:
+            self._logger.info("Program information did not change")
+            self._program_state = self._program_state._replace(fetched_at=fetched_at)
+            return PROGRAM_STATUS_IDLE not in self.program_status
 
-            self._program_status = program_json[PROGRAM_STATUS]
-            
-            if PROGRAM_STATUS_IDLE in self._program_status:
-                self._logger.info("No program information available because no program is active")
-                return False
+        program_json = program_resp[0]
+        program_state = self._parse_response(self.PROGRAM_STATUS_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                             fetched_at=fetched_at)
 
-            self._program_name = program_json[PROGRAM_NAME]
-            self._seconds_to_end = program_json[PROGRAM_DURATION][PROGRAM_DURATION_ACT]
+        if PROGRAM_STATUS_IDLE in program_state.status:
+            self._program_state = program_state
+            self._logger.info("No program information available because no program is active")
+            return False
 
-            self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
-                              self.program_name, self.seconds_to_end / 60, self.date_time_end)
+        self._program_state = self._parse_response(self.PROGRAM_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                                   fetched_at=fetched_at)
 
-            return True
+        self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
+                          self.program_name, self.seconds_to_end / 60, self.date_time_end)
 
-        except DeviceError as e:
-            self._error_code = e.error_code
-            self._error_message = e.message
-            self._error_exception = e
-            return False
+        return True
 
     async def load_consumption_data(self) -> bool:
         """Load power consumption data by calling the corresponding API endpoint"""
-
-        self._logger.info("Loading power consumption data for %s", self._host)
         try:
-            consumption_total = await self.do_consumption_details_request(CMD_VALUE_CONSUMP_DRYER_TOTAL)
-            self._power_consumption_kwh_total = read_kwh_from_string(consumption_total)
-
-            consumption_avg = await self.do_consumption_details_request(CMD_VALUE_CONSUMP_DRYER_AVG)
-            self._power_consumption_kwh_avg = read_kwh_from_string(consumption_avg)
-            
-            self._logger.info("Power consumption total: %s kWh, avg: %.1f kWh",
-                              locale.format_string('%.0f', self._power_consumption_kwh_total, True),
-                              self._power_consumption_kwh_avg)
-
+            await self._load_part(DATA_CONSUMPTION, self._fetch_consumption_data)
         except DeviceError as e:
             self._error_code = e.error_code
             self._error_message = e.message
@@ -100,29 +127,76 @@ class Dryer(BasicDevice):
 
         return True
 
+    async def _fetch_consumption_data(self) -> None:
+        """Like load_consumption_data(), but raises DeviceError"""
+        self._logger.info("Loading power consumption data for %s", self._host)
+
+        consumption_total, consumption_avg = await self._gather_calls(
+            self.do_consumption_details_request(CMD_VALUE_CONSUMP_DRYER_TOTAL),
+            self.do_consumption_details_request(CMD_VALUE_CONSUMP_DRYER_AVG))
+
+        consumption_total = unwrap_call_result(consumption_total)
+        consumption_avg = unwrap_call_result(consumption_avg)
+        self._consumption_stats = ConsumptionStats(power_kwh_total=read_kwh_from_string(consumption_total),
+                                                   power_kwh_avg=read_kwh_from_string(consumption_avg))
+
+        self._logger.info("Power consumption total: %s kWh, avg: %.1f kWh",
+                          locale.format_string('%.0f', self.power_consumption_kwh_total, True),
+                          self.power_consumption_kwh_avg)
+
+    @property
+    def program_state(self) -> ProgramState:
+        return self._program_state
+
+    @property
+    def consumption_stats(self) -> ConsumptionStats:
+        return self._consumption_stats
+
     @property
     def program_status(self) -> str:
-        return self._program_status
+        return self._program_state.status
 
     @property
     def program_name(self) -> str:
-        return self._program_name
+        return self._program_state.name
 
     @property
     def seconds_to_end(self) -> int:
-        return self._seconds_to_end
+        """Remaining seconds of the program, counted down since the program state was fetched"""
+        return math.ceil(self._program_state.remaining(self._program_state.seconds_to_end))
 
     @property
     def date_time_end(self) -> datetime:
-        return datetime.now() + timedelta(seconds=self.seconds_to_end)
+        return self.get_date_time_end()
 
     def get_date_time_end(self, tz=None) -> datetime:
-        return datetime.now(tz) + timedelta(seconds=self.seconds_to_end)
+        seconds_to_end = self._program_state.remaining(self._program_state.seconds_to_end)
+        return datetime.now(tz) + timedelta(seconds=seconds_to_end)
+
+    @property
+    def program_refresh_due_in(self) -> float:
+        """Seconds until the program state must be refreshed (see ProgramState.refresh_due_in())"""
+        return self._program_state.refresh_due_in(self.max_program_state_age)
+
+    @property
+    def is_program_state_stale(self) -> bool:
+        return self.program_refresh_due_in <= 0
+
+    def _part_loaders(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        return {**super()._part_loaders(),
+                DATA_PROGRAM: self._fetch_program_details,
+                DATA_CONSUMPTION: self._fetch_consumption_data}
+
+    def get_tracked_fields(self) -> Dict[str, Any]:
+        values = super().get_tracked_fields()
+        # Report the fetched countdown, the extrapolated one changes without a refresh
+        values['seconds_to_end'] = self._program_state.seconds_to_end
+        return values
 
     @property
     def power_consumption_kwh_total(self) -> float:
-        return self._power_consumption_kwh_total
+        return self._consumption_stats.power_kwh_total
 
     @property
     def power_consumption_kwh_avg(self) -> float:
-        return self._power_consumption_kwh_avg
+        return self._consumption_stats.power_kwh_avg
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import aiohttp
+import logging
+
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from .basic_device import BasicDevice, DeviceTimeoutError
+from .retry import RetryPolicy
+from .instrumentation import RequestListener, create_trace_config
+
+DEFAULT_MAX_CONCURRENT_REFRESHES = 20
+DEFAULT_MAX_REFRESHES_PER_HOST = 1
+DEFAULT_CONNECTOR_LIMIT = 100
+DEFAULT_CONNECTOR_LIMIT_PER_HOST = 4
+
+
+class RefreshOutcome:
+    """Result of refreshing a single device of a fleet"""
+
+    def __init__(self, device: BasicDevice, loaded: bool, error: Optional[BaseException] = None,
+                 started_at: Optional[datetime] = None, wait_duration: float = 0.0, duration: float = 0.0,
+                 failed_parts: Optional[List[str]] = None) -> None:
+        self._device = device
+        self._loaded = loaded
+        self._error = error
+        self._started_at = started_at
+        self._wait_duration = wait_duration
+        self._duration = duration
+        self._failed_parts = failed_parts if failed_parts is not None else []
+
+    def __repr__(self) -> str:
+        return (f"RefreshOutcome(host={self._device.host!r}, loaded={self._loaded}, error={self._error!r}, "
+                f"duration={self._duration:.3f})")
+
+    @property
+    def device(self) -> BasicDevice:
+        return self._device
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self._error
+
+    @property
+    def failed_parts(self) -> List[str]:
+        """Parts of the device data whose last load failed (see BasicDevice.failed_parts)"""
+        return self._failed_parts
+
+    @property
+    def started_at(self) -> Optional[datetime]:
+        """Wall clock time the device refresh started (after waiting for a free slot)"""
+        return self._started_at
+
+    @property
+    def wait_duration(self) -> float:
+        """Seconds spent waiting for a free global / per-host refresh slot"""
+        return self._wait_duration
+
+    @property
+    def duration(self) -> float:
+        """Seconds spent refreshing the device"""
+        return self._duration
+
+
+class DeviceFleet:
+    """
+    Set of devices (any mix of device classes) refreshed with bounded concurrency. All devices without
+    an injected session share one connection pool owned by the fleet.
+    """
+
+    def __init__(self, devices: Iterable[BasicDevice] = (),
+                 max_concurrent_refreshes: int = DEFAULT_MAX_CONCURRENT_REFRESHES,
+                 max_refreshes_per_host: int = DEFAULT_MAX_REFRESHES_PER_HOST,
+                 connector_limit: int = DEFAULT_CONNECTOR_LIMIT,
+                 connector_limit_per_host: int = DEFAULT_CONNECTOR_LIMIT_PER_HOST,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 request_timeout: Optional[aiohttp.ClientTimeout] = None,
+                 refresh_timeout: Optional[float] = None,
+                 retain_raw_json: Optional[bool] = None) -> None:
+        self._devices: Dict[BasicDevice, None] = {}
+        self._max_concurrent_refreshes = max_concurrent_refreshes
+        self._max_refreshes_per_host = max_refreshes_per_host
+        self._connector_limit = connector_limit
+        self._connector_limit_per_host = connector_limit_per_host
+        self._retry_policy = retry_policy
+        self._request_timeout = request_timeout
+        self._refresh_timeout = refresh_timeout
+        self._retain_raw_json = retain_raw_json
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._refresh_semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._request_listeners: List[RequestListener] = []
+        self._logger = logging.getLogger(__name__)
+
+        for device in devices:
+            self.add_device(device)
+
+    async def __aenter__(self) -> DeviceFleet:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    def __contains__(self, device: BasicDevice) -> bool:
+        return device in self._devices
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def add_device(self, device: BasicDevice) -> None:
+        """
+        Add a device to the fleet. If the fleet has a retry policy, request timeout or raw JSON retention
+        setting they replace the ones of the device. The request listeners of the fleet are registered on
+        the device.
+        """
+        if self._retry_policy is not None:
+            device.retry_policy = self._retry_policy
+        if self._request_timeout is not None:
+            device.timeout = self._request_timeout
+        if self._retain_raw_json is not None:
+            device.retain_raw_json = self._retain_raw_json
+        if device not in self._devices:
+            for listener in self._request_listeners:
+                device.add_request_listener(listener)
+        self._devices[device] = None
+
+    def remove_device(self, device: BasicDevice) -> None:
+        del self._devices[device]
+        for listener in self._request_listeners:
+            device.remove_request_listener(listener)
+
+    def add_request_listener(self, listener: RequestListener) -> None:
+        """Register a request listener (see BasicDevice.add_request_listener()) on all devices of the fleet"""
+        self._request_listeners.append(listener)
+        for device in self._devices:
+            device.add_request_listener(listener)
+
+    def remove_request_listener(self, listener: RequestListener) -> None:
+        self._request_listeners.remove(listener)
+        for device in self._devices:
+            device.remove_request_listener(listener)
+
+    async def close(self) -> None:
+        """Close the shared connection pool. Devices using it switch back to their own session."""
+        if self._session is not None:
+            for device in self._devices:
+                if device.session is self._session:
+                    await device.attach_session(None)
+
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._connector_limit,
+                                             limit_per_host=self._connector_limit_per_host)
+            # Without request listeners the trace callbacks would only cost time
+            self._session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[create_trace_config()] if self._request_listeners else None)
+        return self._session
+
+    def _get_refresh_semaphore(self) -> asyncio.Semaphore:
+        if self._refresh_semaphore is None:
+            self._refresh_semaphore = asyncio.Semaphore(self._max_concurrent_refreshes)
+        return self._refresh_semaphore
+
+    def _get_host_semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self._max_refreshes_per_host)
+        return self._host_semaphores[host]
+
+    async def refresh_device(self, device: BasicDevice) -> RefreshOutcome:
+        """Refresh a single device within the concurrency limits of the fleet"""
+        queued = time.monotonic()
+
+        # Devices without an injected session use the shared connection pool of the fleet
+        if device.owns_session:
+            await device.attach_session(self._get_session())
+
+        # Acquire the host slot first, so devices waiting for a busy host do not block global slots
+        async with self._get_host_semaphore(device.host), self._get_refresh_semaphore():
+            started_at = datetime.now()
+            started = time.monotonic()
+            error: Optional[BaseException]
+            try:
+                loaded = await asyncio.wait_for(device.load_all_information(), self._refresh_timeout)
+                error = None if loaded else device.error_exception
+            except asyncio.TimeoutError as e:
+                self._logger.error("Refresh of %s did not finish within %.1f seconds", device.host,
+                                   self._refresh_timeout)
+                loaded = False
+                error = DeviceTimeoutError("Refresh timeout exceeded", "n/a", e)
+            except Exception as e:
+                # A bug or unexpected response of one device must not break the refresh of the whole fleet
+                self._logger.exception("Unexpected error while refreshing %s", device.host)
+                loaded = False
+                error = e
+
+        return RefreshOutcome(device, loaded, error, started_at, started - queued, time.monotonic() - started,
+                              device.failed_parts)
+
+    async def refresh(self) -> List[RefreshOutcome]:
+        """Refresh all devices of the fleet and return the outcomes in device order"""
+        devices = list(self._devices)
+        self._logger.info("Refreshing %d devices", len(devices))
+        return list(await asyncio.gather(*(self.refresh_device(device) for device in devices)))
+
+    async def refresh_iter(self) -> AsyncIterator[Tuple[BasicDevice, RefreshOutcome]]:
+        """
+        Refresh all devices of the fleet and yield every device together with its outcome as soon as it
+        is refreshed (completion order). Refreshes not yet finished are cancelled if the iteration is
+        stopped early.
+        """
+        tasks = [asyncio.ensure_future(self.refresh_device(device)) for device in self._devices]
+        self._logger.info("Refreshing %d devices", len(tasks))
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                outcome = await next_done
+                yield outcome.device, outcome
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @property
+    def devices(self) -> List[BasicDevice]:
+        return list(self._devices)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import weakref
+
+from typing import Any, Callable, Coroutine, Dict, Optional, Tuple
+from .circuit_breaker import CircuitBreaker
+from .digest_auth import DigestAuth
+
+
+class HostState:
+    """
+    State shared by all device instances talking to the same host with the same credentials: digest auth
+    (last challenge, cached HA1), circuit breaker and the calls currently in flight.
+    """
+
+    def __init__(self, host: str, username: str = "", password: str = "") -> None:
+        self.host = host
+        self.auth = DigestAuth(username, password)
+        self.circuit_breaker = CircuitBreaker()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def in_flight_calls(self) -> int:
+        return len(self._in_flight)
+
+    async def single_flight(self, key: str, call: Callable[[], Coroutine[Any, Any, Any]]) -> Any:
+        """
+        Run the given call unless an identical call (same key) is already in flight, in which case its
+        result is shared. Cancelling one caller does not cancel the call for the others. The shared call
+        runs entirely in the context of the first caller: session, request timeout, refresh deadline and
+        request listeners of later callers do not apply to it.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._call_done(key, done))
+
+        return await asyncio.shield(task)
+
+    def _call_done(self, key: str, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        # Retrieve the exception, in case all callers were cancelled before the call finished
+        if not task.cancelled():
+            task.exception()
+
+
+class HostRegistry:
+    """Registry of the host states, so several device instances for the same host share one state"""
+
+    def __init__(self) -> None:
+        self._hosts: weakref.WeakValueDictionary[Tuple[str, str, str], HostState] = weakref.WeakValueDictionary()
+
+    def get(self, host: str, username: str = "", password: str = "") -> HostState:
+        key = (host.replace("http://", "").rstrip("/"), username, password)
+        state: Optional[HostState] = self._hosts.get(key)
+        if state is None:
+            state = HostState(*key)
+            self._hosts[key] = state
+        return state
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+
+# Registry used by devices created without a specific registry
+default_host_registry = HostRegistry()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import time
+import aiohttp
+import contextvars
+
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+from yarl import URL
+from .const import QUERY_PARAM_COMMAND
+
+# Attempt number (1 = first try) of the device call currently made, set by the retry loop
+_request_attempt: contextvars.ContextVar[int] = contextvars.ContextVar('vzug_request_attempt', default=1)
+
+
+class RequestRecord:
+    """
+    Record of a single device API call (including the digest auth challenge round trip, if any), passed to
+    the request listeners of a device. Timings are in seconds; connect_duration, ttfb and connection_reused
+    are only known if the session was created with the trace config of create_trace_config().
+    """
+
+    def __init__(self, host: str, url: URL, attempt: int = 1) -> None:
+        self.host = host
+        self.endpoint = url.path
+        self.command = url.query.get(QUERY_PARAM_COMMAND, '')
+        self.attempt = attempt
+        self.status: Optional[int] = None
+        self.response_bytes = 0
+        self.duration = 0.0
+        self.auth_challenge = False
+        self.error: Optional[BaseException] = None
+        self.connect_duration: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.connection_reused: Optional[bool] = None
+        self._started = time.perf_counter()
+        self._request_started = self._started
+
+    def __repr__(self) -> str:
+        return (f"RequestRecord(host={self.host!r}, command={self.command!r}, status={self.status}, "
+                f"bytes={self.response_bytes}, duration={self.duration:.3f}, attempt={self.attempt}, "
+                f"auth_challenge={self.auth_challenge})")
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def finish(self, status: Optional[int], response_bytes: int = 0, error: Optional[BaseException] = None) -> None:
+        self.status = status
+        self.response_bytes = response_bytes
+        self.error = error
+        self.duration = time.perf_counter() - self._started
+
+
+RequestListener = Callable[[RequestRecord], Any]
+
+
+def current_attempt() -> int:
+    return _request_attempt.get()
+
+
+def _get_record(trace_config_ctx: SimpleNamespace) -> Optional[RequestRecord]:
+    # The trace request context is shared with other trace configs of the session, ignore foreign contexts
+    record = trace_config_ctx.trace_request_ctx
+    return record if isinstance(record, RequestRecord) else None
+
+
+async def _on_request_start(session: aiohttp.ClientSession, trace_config_ctx: SimpleNamespace,
+                            params: aiohttp.TraceRequestStartParams) -> None:
+    record = _get_record(trace_config_ctx)
+    if record is not None:
+        record._request_started = time.perf_counter()
+
+
+async def _on_connection_create_start(session: aiohttp.ClientSession, trace_config_ctx: SimpleNamespace,
+                                      params: aiohttp.TraceConnectionCreateStartParams) -> None:
+    trace_config_ctx.connect_started = time.perf_counter()
+
+
+async def _on_connection_create_end(session: aiohttp.ClientSession, trace_config_ctx: SimpleNamespace,
+                                    params: aiohttp.TraceConnectionCreateEndParams) -> None:
+    record = _get_record(trace_config_ctx)
+    if record is not None:
+        # Summed up: the challenge round trip may need a connection of its own
+        record.connect_duration = ((record.connect_duration or 0.0) +
+                                   time.perf_counter() - trace_config_ctx.connect_started)
+        record.connection_reused = False
+
+
+async def _on_connection_reuseconn(session: aiohttp.ClientSession, trace_config_ctx: SimpleNamespace,
+                                   params: aiohttp.TraceConnectionReuseconnParams) -> None:
+    record = _get_record(trace_config_ctx)
+    if record is not None and record.connection_reused is None:
+        record.connection_reused = True
+
+
+async def _on_request_end(session: aiohttp.ClientSession, trace_config_ctx: SimpleNamespace,
+                          params: aiohttp.TraceRequestEndParams) -> None:
+    # Called as soon as the response headers are received, the body is read later
+    record = _get_record(trace_config_ctx)
+    if record is not None:
+        record.ttfb = time.perf_counter() - record._request_started
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """
+    aiohttp trace config filling in the connect / time to first byte timings of the request records. It is
+    added to the sessions created by devices and fleets with request listeners (so requests without listeners
+    do not run the trace callbacks), add it to injected sessions to get the timings.
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+
+from typing import Any, Callable, Dict
+
+# Decoder turning a raw (utf-8) response body into python objects. Decoders must raise ValueError
+# (or a subclass like json.JSONDecodeError) for invalid input.
+JsonDecoder = Callable[[bytes], Any]
+
+DECODER_JSON = 'json'
+DECODER_ORJSON = 'orjson'
+DECODER_UJSON = 'ujson'
+DECODER_AUTO = 'auto'
+
+
+def json_loads_utf8(body: bytes) -> Any:
+    """
+    Stdlib decoder. Device responses are utf-8, decoding them directly is faster than json.loads(bytes),
+    which detects the encoding on every call.
+    """
+    return json.loads(body.decode('utf-8'))
+
+
+def _load_decoders() -> Dict[str, JsonDecoder]:
+    decoders: Dict[str, JsonDecoder] = {DECODER_JSON: json_loads_utf8}
+
+    try:
+        import orjson  # type: ignore[import]
+        decoders[DECODER_ORJSON] = orjson.loads
+    except ImportError:
+        pass
+
+    try:
+        import ujson  # type: ignore[import]
+        decoders[DECODER_UJSON] = ujson.loads
+    except ImportError:
+        pass
+
+    return decoders
+
+
+_DECODERS = _load_decoders()
+
+
+def available_json_decoders() -> Dict[str, JsonDecoder]:
+    """Decoders which can be used in this environment by name"""
+    return dict(_DECODERS)
+
+
+def get_json_decoder(name: str = DECODER_JSON) -> JsonDecoder:
+    """
+    Return the decoder with the given name: 'json' (stdlib), 'orjson' or 'ujson' (if installed). 'auto'
+    returns the fastest installed decoder.
+    """
+    if name == DECODER_AUTO:
+        for preferred in (DECODER_ORJSON, DECODER_UJSON, DECODER_JSON):
+            if preferred in _DECODERS:
+                return _DECODERS[preferred]
+
+    if name not in _DECODERS:
+        raise ValueError(f"JSON decoder '{name}' is not available (installed: {', '.join(_DECODERS)})")
+
+    return _DECODERS[name]
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import time
+import random
+import contextlib
+import contextvars
+
+from typing import Iterator, Optional
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 4.0
+DEFAULT_MULTIPLIER = 2.0
+DEFAULT_JITTER = 0.5
+DEFAULT_REFRESH_DEADLINE = 15.0
+
+# Absolute time.monotonic() value until the running refresh (and all calls it makes) must be finished
+_refresh_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('vzug_refresh_deadline',
+                                                                                    default=None)
+
+
+class RetryPolicy:
+    """
+    Retry policy for device calls: exponential backoff with jitter, a max. number of attempts per call
+    and an overall deadline budget (seconds) for a whole refresh, shared by all calls of the refresh.
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 multiplier: float = DEFAULT_MULTIPLIER,
+                 jitter: float = DEFAULT_JITTER,
+                 deadline: Optional[float] = DEFAULT_REFRESH_DEADLINE) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def __repr__(self) -> str:
+        return (f"RetryPolicy(max_attempts={self.max_attempts}, base_delay={self.base_delay}, "
+                f"max_delay={self.max_delay}, multiplier={self.multiplier}, jitter={self.jitter}, "
+                f"deadline={self.deadline})")
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before the retry following the given (failed) attempt. The jitter randomly shortens the
+        exponential delay by up to the given fraction, so devices failing together do not retry in lockstep.
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def next_delay(self, attempt: int) -> Optional[float]:
+        """
+        Delay before retrying after the given failed attempt or None if the call must not be retried,
+        either because all attempts are used or because the retry would not finish within the deadline.
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = self.backoff(attempt)
+        remaining = deadline_remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+
+        return delay
+
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left of the deadline of the running refresh or None if there is no deadline"""
+    deadline = _refresh_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Run the enclosed refresh with a deadline of the given seconds. Nested scopes never extend the deadline
+    of an enclosing scope, so calls made by a refresh consume the budget of the whole refresh.
+    """
+    deadline = _refresh_deadline.get()
+    if seconds is not None:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+
+    token = _refresh_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _refresh_deadline.reset(token)
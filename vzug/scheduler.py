@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import time
+import heapq
+import asyncio
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .basic_device import BasicDevice
+from .fleet import DeviceFleet, RefreshOutcome
+
+DEFAULT_IDLE_INTERVAL = 300.0
+DEFAULT_ACTIVE_INTERVAL = 60.0
+DEFAULT_NEAR_EVENT_INTERVAL = 10.0
+DEFAULT_NEAR_EVENT_WINDOW = 120.0
+DEFAULT_ERROR_INTERVAL = 60.0
+
+PROGRAM_STATUS_IDLE = 'idle'
+PROGRAM_STATUS_TIMED = 'timed'
+
+
+class PollPolicy:
+    """
+    Compute the delay until the next poll of a device from its last known state: rarely while idle,
+    moderately while a program is running and densely around the predicted program start / end.
+    """
+
+    def __init__(self, idle_interval: float = DEFAULT_IDLE_INTERVAL,
+                 active_interval: float = DEFAULT_ACTIVE_INTERVAL,
+                 near_event_interval: float = DEFAULT_NEAR_EVENT_INTERVAL,
+                 near_event_window: float = DEFAULT_NEAR_EVENT_WINDOW,
+                 error_interval: float = DEFAULT_ERROR_INTERVAL) -> None:
+        self.idle_interval = idle_interval
+        self.active_interval = active_interval
+        self.near_event_interval = near_event_interval
+        self.near_event_window = near_event_window
+        self.error_interval = error_interval
+
+    def next_delay(self, device: BasicDevice, loaded: bool = True) -> float:
+        """Return the number of seconds until the given device should be polled again"""
+
+        if not loaded:
+            # Do not poll hosts with an open circuit before the circuit becomes half-open
+            return max(self.error_interval, device.circuit_breaker.retry_in)
+
+        program_status = getattr(device, 'program_status', '')
+        if not device.is_active or PROGRAM_STATUS_IDLE in program_status:
+            return self.idle_interval
+
+        # Next predicted event: program start for timed programs (dishwasher), otherwise program end
+        if PROGRAM_STATUS_TIMED in program_status:
+            seconds_to_event = getattr(device, 'seconds_to_start', 0)
+        else:
+            seconds_to_event = getattr(device, 'seconds_to_end', 0)
+
+        if seconds_to_event <= 0:
+            return self.active_interval
+
+        if seconds_to_event <= self.near_event_window:
+            return self.near_event_interval
+
+        # Poll moderately, but wake up in time when the window around the predicted event starts
+        return max(self.near_event_interval, min(self.active_interval, seconds_to_event - self.near_event_window))
+
+
+class PollScheduler:
+    """
+    Poll the devices of a fleet, each one at the time chosen by the poll policy. All devices are kept in
+    a single timer heap, so only devices being refreshed have a running task.
+    """
+
+    def __init__(self, fleet: DeviceFleet, policy: Optional[PollPolicy] = None,
+                 on_result: Optional[Callable[[RefreshOutcome], Any]] = None) -> None:
+        self._fleet = fleet
+        self._policy = policy if policy is not None else PollPolicy()
+        self._on_result = on_result
+        self._heap: List[Tuple[float, int, BasicDevice]] = []
+        self._due: Dict[BasicDevice, float] = {}
+        self._sequence = 0
+        self._in_flight: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+        self._logger = logging.getLogger(__name__)
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def schedule(self, device: BasicDevice, delay: float = 0.0) -> None:
+        """(Re-)schedule the poll of the given device in delay seconds"""
+        due = time.monotonic() + delay
+        self._sequence += 1
+        # Older heap entries of the device stay in the heap and are skipped when popped
+        self._due[device] = due
+        heapq.heappush(self._heap, (due, self._sequence, device))
+        self._wake()
+
+    def unschedule(self, device: BasicDevice) -> None:
+        self._due.pop(device, None)
+
+    def next_poll_in(self, device: BasicDevice) -> Optional[float]:
+        """Seconds until the next poll of the given device or None if it is not scheduled"""
+        due = self._due.get(device)
+        return None if due is None else max(0.0, due - time.monotonic())
+
+    def stop(self) -> None:
+        self._running = False
+        self._wake()
+
+    async def run(self) -> None:
+        """Poll the devices until stop() is called. Devices of the fleet not scheduled yet are polled at once."""
+
+        self._running = True
+        self._wakeup = asyncio.Event()
+        for device in self._fleet.devices:
+            if device not in self._due:
+                self.schedule(device)
+
+        try:
+            while self._running:
+                self._wakeup.clear()
+                timeout = self._start_due_polls()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self._in_flight:
+                task.cancel()
+            self._in_flight.clear()
+
+    def _start_due_polls(self) -> Optional[float]:
+        """Start a refresh for all devices due now and return the seconds until the next device is due"""
+
+        now = time.monotonic()
+        while self._heap:
+            due, _, device = self._heap[0]
+            if self._due.get(device) != due:
+                heapq.heappop(self._heap)  # Stale entry of an unscheduled / rescheduled device
+                continue
+
+            if due > now:
+                return due - now
+
+            heapq.heappop(self._heap)
+            del self._due[device]
+            task = asyncio.ensure_future(self._poll(device))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+        return None
+
+    async def _poll(self, device: BasicDevice) -> None:
+        outcome = await self._fleet.refresh_device(device)
+        delay = self._policy.next_delay(device, outcome.loaded)
+        self._logger.debug("Next poll of %s in %.0f seconds", device.host, delay)
+
+        if self._running and device in self._fleet and device not in self._due:
+            self.schedule(device, delay)
+
+        if self._on_result is not None:
+            try:
+                self._on_result(outcome)
+            except Exception:
+                self._logger.exception("Error in poll result callback for %s", device.host)
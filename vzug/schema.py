@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Type, Union
+from .util import strtobool
+from .state import ProgramState
+
+# Default of fields which must be present in the response
+REQUIRED: Any = object()
+
+_MISSING: Any = object()
+
+
+class ResponseSchemaError(ValueError):
+    """The response does not match the schema (missing required field, unexpected type, invalid value)"""
+
+
+def to_bool(value: Any) -> bool:
+    """Converter for flags sent as JSON booleans or as strings like 'true' / 'false'"""
+    return value if isinstance(value, bool) else bool(strtobool(value))
+
+
+def not_bool(value: Any) -> bool:
+    """Converter for negated flags like 'Inactive'"""
+    return not to_bool(value)
+
+
+class Field:
+    """
+    Field of a JSON response: name of the parsed field, key path in the response (a key or a sequence
+    of keys for nested objects), default if the key path is missing and a converter for present values
+    """
+
+    __slots__ = ('name', 'path', 'default', 'converter')
+
+    def __init__(self, name: str, path: Union[str, Sequence[str]], default: Any = REQUIRED,
+                 converter: Optional[Callable[[Any], Any]] = None) -> None:
+        self.name = name
+        self.path: Tuple[str, ...] = (path,) if isinstance(path, str) else tuple(path)
+        self.default = default
+        self.converter = converter
+
+    def __repr__(self) -> str:
+        return f"Field({self.name!r}, {'.'.join(self.path)!r})"
+
+
+def _compile_getter(path: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Any]:
+    """Getter for the given key path, returning _MISSING if a key is missing"""
+    if len(path) == 1:
+        key = path[0]
+        return lambda response: response.get(key, _MISSING)
+
+    if len(path) == 2:
+        outer, inner = path
+
+        def get_nested(response: Dict[str, Any]) -> Any:
+            value = response.get(outer, _MISSING)
+            return value if value is _MISSING else value.get(inner, _MISSING)
+        return get_nested
+
+    def get_path(response: Dict[str, Any]) -> Any:
+        value: Any = response
+        for key in path:
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                break
+        return value
+    return get_path
+
+
+class ResponseSchema:
+    """
+    Declarative mapping of a JSON response to the fields of a snapshot type (see state.py). The fields
+    are compiled once, when the schema is created (usually as class attribute of a device class), into
+    getters with precomputed key paths, so parsing a response is a single loop over the compiled fields.
+    """
+
+    def __init__(self, target: Type[Any], *fields: Field) -> None:
+        unknown = [field.name for field in fields if field.name not in target._fields]
+        if unknown:
+            raise ValueError(f"{target.__name__} has no fields {', '.join(unknown)}")
+
+        self._target = target
+        self._fields = fields
+        self._compiled = tuple((field.name, _compile_getter(field.path), field.default, field.converter)
+                               for field in fields)
+
+    def __repr__(self) -> str:
+        return f"ResponseSchema({self._target.__name__}, {', '.join(repr(field) for field in self._fields)})"
+
+    @property
+    def fields(self) -> Tuple[Field, ...]:
+        return self._fields
+
+    def extract(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the values of all fields of the given response (field name -> value)"""
+        values = {}
+        try:
+            for name, get, default, converter in self._compiled:
+                value = get(response)
+                if value is _MISSING:
+                    if default is REQUIRED:
+                        raise ResponseSchemaError(f"Field '{name}' is missing in the response")
+                    value = default
+                elif converter is not None:
+                    value = converter(value)
+                values[name] = value
+
+        except (AttributeError, TypeError) as e:
+            raise ResponseSchemaError(f"Unexpected response structure: {e}") from e
+
+        return values
+
+    def parse(self, response: Dict[str, Any], **extra: Any) -> Any:
+        """Parse the given response into a new snapshot, extra values are set on the snapshot as given"""
+        return self._target(**self.extract(response), **extra)
+
+
+# Fields of the getProgram response shared by all device types
+PROGRAM_STATUS_FIELD = Field('status', 'status')
+PROGRAM_NAME_FIELD = Field('name', 'name')
+PROGRAM_SECONDS_TO_END_FIELD = Field('seconds_to_end', ('duration', 'act'))
+
+# Program status only, for idle devices (the response does not contain the program details)
+PROGRAM_STATUS_SCHEMA = ResponseSchema(ProgramState, PROGRAM_STATUS_FIELD)
+
+# Running program with remaining time
+ACTIVE_PROGRAM_SCHEMA = ResponseSchema(ProgramState, PROGRAM_STATUS_FIELD, PROGRAM_NAME_FIELD,
+                                       PROGRAM_SECONDS_TO_END_FIELD)
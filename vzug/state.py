@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import time
+
+from typing import Any, Dict, NamedTuple, Optional
+
+# Immutable snapshots of the device state. Each refresh builds new snapshots and swaps them in with a single
+# assignment, so readers never see a half-updated device. Named tuples have no per-instance __dict__, which
+# keeps the footprint small for large fleets.
+
+# Age of a program state after which it should be refreshed even if no countdown has run out
+DEFAULT_MAX_PROGRAM_STATE_AGE = 300.0
+
+
+class DeviceStatus(NamedTuple):
+    """Parsed getDeviceStatus response"""
+    serial: str = ""
+    device_name: str = ""
+    status: str = ""
+    uuid: str = ""
+    program: str = ""
+    is_active: bool = False
+    status_json: Optional[Dict[str, Any]] = None
+
+
+class ProgramState(NamedTuple):
+    """Parsed getProgram response (fields not sent by a device type keep their defaults)"""
+    status: str = ""
+    name: str = ""
+    seconds_to_end: int = 0
+    seconds_to_start: int = 0
+    duration: int = 0
+    is_energy_saving: bool = False
+    is_opti_start: bool = False
+    is_partialload: bool = False
+    is_rinse_plus: bool = False
+    is_dry_plus: bool = False
+    # time.monotonic() when the response was received, None if not fetched from a device
+    fetched_at: Optional[float] = None
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the state was fetched (now: time.monotonic() value), None if it was not fetched"""
+        if self.fetched_at is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.fetched_at
+
+    def remaining(self, seconds: int, now: Optional[float] = None) -> float:
+        """Extrapolate a countdown of this state (e.g. seconds_to_end) to now"""
+        age = self.age(now)
+        return float(seconds) if age is None else max(0.0, seconds - age)
+
+    def refresh_due_in(self, max_age: float, now: Optional[float] = None) -> float:
+        """
+        Seconds until the state should be refreshed: when it gets older than max_age or when a countdown runs
+        out (the program starts or ends, so the extrapolation is no longer valid). 0 if not fetched.
+        """
+        age = self.age(now)
+        if age is None:
+            return 0.0
+
+        due = max_age - age
+        for seconds in (self.seconds_to_start, self.seconds_to_end):
+            if seconds > 0:
+                due = min(due, seconds - age)
+        return max(0.0, due)
+
+
+class ConsumptionStats(NamedTuple):
+    """Total and average (per program) power and water consumption"""
+    power_kwh_total: float = 0.0
+    power_kwh_avg: float = 0.0
+    water_l_total: float = 0.0
+    water_l_avg: float = 0.0
+
+
+class OptiDosState(NamedTuple):
+    """Configuration and fill levels of the optiDos detergent dosing (washing machines)"""
+    active: bool = False
+    config: str = ""
+    a_status: str = ""
+    b_status: str = ""
+
+
+class ComponentStatus(NamedTuple):
+    """Outcome of loading one component of the device data (identity, status, program, consumption, optiDos)"""
+    # time.monotonic() of the last successful / failed load, None if there was none
+    last_success: Optional[float] = None
+    last_failure: Optional[float] = None
+    # Error of the last failed load (kept after later successful loads, see failed)
+    last_error: Optional[BaseException] = None
+
+    @property
+    def failed(self) -> bool:
+        """Whether the last load of the component failed (its data is from an earlier load, if any)"""
+        return self.last_failure is not None and (self.last_success is None or self.last_failure > self.last_success)
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the last successful load (now: time.monotonic() value), None if it was never loaded"""
+        if self.last_success is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.last_success
+
+
+# Initial states, shared by all devices (snapshots are immutable)
+EMPTY_DEVICE_STATUS = DeviceStatus()
+EMPTY_PROGRAM_STATE = ProgramState()
+EMPTY_CONSUMPTION_STATS = ConsumptionStats()
+EMPTY_OPTIDOS_STATE = OptiDosState()
+EMPTY_COMPONENT_STATUS = ComponentStatus()
@@ -1,9 +1,15 @@
+import math
+import functools
+import time
 import locale
 
 from datetime import datetime, timedelta
-from typing import Dict, Any
-from .basic_device import BasicDevice, DeviceError, read_kwh_from_string, read_float_from_string
-from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM
+from typing import Any, Awaitable, Callable, Dict
+from .basic_device import BasicDevice, DeviceError, read_consumption_from_string, unwrap_call_result
+from .const import ENDPOINT_HH, COMMAND_GET_PROGRAM, DATA_PROGRAM, DATA_CONSUMPTION, DATA_OPTIDOS
+from .schema import Field, ResponseSchema, ACTIVE_PROGRAM_SCHEMA, PROGRAM_STATUS_SCHEMA
+from .state import (DEFAULT_MAX_PROGRAM_STATE_AGE, ConsumptionStats, OptiDosState, ProgramState, EMPTY_PROGRAM_STATE,
+                    EMPTY_OPTIDOS_STATE, EMPTY_CONSUMPTION_STATS)
 
 locale.setlocale(locale.LC_ALL, '')  # Use '' for auto, or force e.g. to 'en_US.UTF-8'
 
@@ -24,142 +30,159 @@ PROGRAM_OPTIDOS_FILL_LEVEL_ACT = 'act'
 
 CONSUMPTION_DETAILS_VALUE = 'value'
 
-REGEX_MATCH_LITER = r"(\d+(?:[\,\.]\d+)?).?ℓ"
-
 
 def read_liter_from_string(consumption_value: str) -> float:
-    liter = read_float_from_string(consumption_value, REGEX_MATCH_LITER)
-    if liter < 0:
-        raise DeviceError('Cannot find liter value in string {0}'.format(consumption_value), 'n/a')
-
-    return liter
+    return read_consumption_from_string(consumption_value, 'liter')[0]
 
 
 class WashingMachine(BasicDevice):
     """Class representing V-Zug washing machines"""
 
-    def __init__(self, host: str, username: str = "", password: str = ""):
-        super().__init__(host, username, password)
-        self._seconds_to_end = 0
-        self._program_name = ""
-        self._program_status = ""
-        self._optidos_active = False
-        self._optidos_config = ""
-        self._optidos_a_status = ""
-        self._optidos_b_status = ""
-        self._power_consumption_kwh_total = 0.0
-        self._water_consumption_l_total = 0.0
-        self._power_consumption_kwh_avg = 0.0
-        self._water_consumption_l_avg = 0.0
-
-    def _reset_active_program_information(self) -> None:
-        self._seconds_to_end = 0
-        self._program_name = ""
-        self._program_status = ""
-        self._optidos_active = False
-        self._optidos_config = ""
-
-    async def load_all_information(self) -> bool:
-        """Load consumption data and if a program is active load also the program details"""
-        loaded = await super().load_all_information()
-        if loaded:
+    TRACKED_FIELDS = BasicDevice.TRACKED_FIELDS + (
+        'program_status', 'program_name', 'seconds_to_end', 'optidos_active', 'optidos_a_status',
+        'optidos_b_status', 'power_consumption_kwh_total', 'power_consumption_kwh_avg',
+        'water_consumption_l_total', 'water_consumption_l_avg')
+
+    # Consumption is reloaded when a program ended, optiDos fill levels also hourly to notice refills
+    refresh_intervals = {DATA_CONSUMPTION: None, DATA_OPTIDOS: 3600.0}
+    INVALIDATE_WHEN_INACTIVE = (DATA_CONSUMPTION, DATA_OPTIDOS)
+
+    FIELD_PARTS = {
+        **BasicDevice.FIELD_PARTS,
+        **dict.fromkeys(
+            ('program_state', 'program_status', 'program_name', 'seconds_to_end', 'date_time_end',
+             'program_refresh_due_in', 'is_program_state_stale'), DATA_PROGRAM),
+        **dict.fromkeys(('optidos_state', 'optidos_active', 'optidos_a_status', 'optidos_b_status'), DATA_OPTIDOS),
+        **dict.fromkeys(
+            ('consumption_stats', 'power_consumption_kwh_total', 'power_consumption_kwh_avg',
+             'water_consumption_l_total', 'water_consumption_l_avg'), DATA_CONSUMPTION),
+    }
+    # The getProgram response also contains the optiDos data
+    PART_COVERS = {DATA_PROGRAM: (DATA_OPTIDOS,)}
+
+    # Age after which the program state should be refreshed even if no countdown ran out
+    max_program_state_age: float = DEFAULT_MAX_PROGRAM_STATE_AGE
+
+    PROGRAM_STATUS_SCHEMA = PROGRAM_STATUS_SCHEMA
+    PROGRAM_SCHEMA = ACTIVE_PROGRAM_SCHEMA
+    OPTIDOS_SCHEMA = ResponseSchema(
+        OptiDosState,
+        Field('active', (PROGRAM_OPTIDOS, PROGRAM_OPTIDOS_SET), default=False,
+              converter=lambda config: config == PROGRAM_OPTIDOS_DETERGENT_A_B),
+        Field('config', (PROGRAM_OPTIDOS, PROGRAM_OPTIDOS_SET), default=""),
+        Field('a_status', (PROGRAM_OPTIDOS_FILL_LEVEL_A, PROGRAM_OPTIDOS_FILL_LEVEL_ACT), default=""),
+        Field('b_status', (PROGRAM_OPTIDOS_FILL_LEVEL_B, PROGRAM_OPTIDOS_FILL_LEVEL_ACT), default=""))
+
+    def __init__(self, host: str, username: str = "", password: str = "", **kwargs: Any):
+        super().__init__(host, username, password, **kwargs)
+        self._program_state = EMPTY_PROGRAM_STATE
+        self._optidos_state = EMPTY_OPTIDOS_STATE
+        self._consumption_stats = EMPTY_CONSUMPTION_STATS
+        self._program_opti_dos_only = False
+
+    async def _load_all_information(self) -> bool:
+        """
+        Load the program details if a program is active. Consumption and optiDos data only change when a
+        program ends (or detergent is refilled), they are loaded when due (see refresh_intervals).
+        """
+        # Without the status it is unknown which parts are needed
+        if not await super()._load_all_information():
+            return False
+
+        # A failed part does not prevent loading the other parts (see failed_parts)
+        loaded = True
+        if self.is_data_due(DATA_CONSUMPTION):
             loaded = await self.load_consumption_data()
-            if loaded and self.is_active:
-                loaded = await self.load_program_details()
-            else:
-                # If no program is active only load the optiDos data. (Use same function because the optiDos
-                # information is returned on the active program endpoint)
-                loaded = await self.load_program_details(True)
+
+        if self.is_active:
+            loaded = await self.load_program_details() and loaded
+        elif self.is_data_due(DATA_OPTIDOS):
+            # If no program is active only load the optiDos data. (Use same function because the optiDos
+            # information is returned on the active program endpoint)
+            loaded = await self.load_program_details(True) and loaded
 
         return loaded
 
     async def load_program_details(self, opti_dos_only: bool = False) -> bool:
-        """Load program details information by calling the corresponding API endpoint"""
-
-        self._logger.info("Loading program information for %s", self._host)
-
-        self._reset_active_program_information()
-
+        """
+        Load program details information by calling the corresponding API endpoint. If the response did
+        not change since the last call (with the same opti_dos_only value) it is not parsed again.
+        """
         try:
-            program_json = (await self.make_vzug_device_call_json(
-                self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM)))[0]
-
-            self._program_status = program_json[PROGRAM_STATUS]
-
-            # Load optiDos detailed information if optiDos is available / active
-            # (optiDos may be available even if no program is active...)
-            self._read_optidos_details(program_json)
-
-            # Skip if only die optiDos data should be loaded
-            if opti_dos_only:
-                return True
-
-            if PROGRAM_STATUS_IDLE in self._program_status:
-                self._logger.info("No program information available because no program is active")
-                return False
-
-            self._program_name = program_json[PROGRAM_NAME]
-            self._seconds_to_end = program_json[PROGRAM_DURATION][PROGRAM_DURATION_ACT]
-
-            self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
-                              self.program_name, self.seconds_to_end / 60, self.date_time_end)
-
-            return True
-
+            return await self._load_part(DATA_OPTIDOS if opti_dos_only else DATA_PROGRAM,
+                                         self._fetch_program_details, opti_dos_only)
         except DeviceError as e:
             self._error_code = e.error_code
             self._error_message = e.message
             self._error_exception = e
             return False
 
-    def _read_optidos_details(self, program_json: Dict[Any, Any]) -> None:
-        """Read optiDos information from given program response"""
+    async def _fetch_program_details(self, opti_dos_only: bool = False) -> bool:
+        """Like load_program_details(), but raises DeviceError"""
+        self._logger.info("Loading program information for %s", self._host)
 
-        self._optidos_a_status = ""
-        self._optidos_b_status = ""
+        # A response parsed in the other mode did not set the same fields, so it must not be skipped
+        if opti_dos_only != self._program_opti_dos_only:
+            self._response_digests.pop(COMMAND_GET_PROGRAM, None)
+
+        program_resp = await self.make_vzug_device_call_json_if_changed(
+            self.get_command_url(ENDPOINT_HH, COMMAND_GET_PROGRAM), COMMAND_GET_PROGRAM)
+        fetched_at = time.monotonic()
+
+        if program_resp is None:
+            self._logger.info("Program information did not change")
+            if not opti_dos_only:
+                self._program_state = self._program_state._replace(fetched_at=fetched_at)
+            return opti_dos_only or PROGRAM_STATUS_IDLE not in self.program_status
+
+        program_json = program_resp[0]
+        self._program_opti_dos_only = opti_dos_only
+
+        # Load optiDos detailed information if optiDos is available / active
+        # (optiDos may be available even if no program is active...)
+        self._optidos_state = self._read_optidos_details(program_json)
+
+        # Skip if only die optiDos data should be loaded
+        program_state = self._parse_response(self.PROGRAM_STATUS_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                             fetched_at=fetched_at)
+        if opti_dos_only:
+            # The state of a running program is only replaced by a full program load, not by its status alone
+            if PROGRAM_STATUS_IDLE in program_state.status:
+                self._program_state = program_state
+            return True
 
-        if PROGRAM_OPTIDOS_FILL_LEVEL_A in program_json:
-            self._optidos_a_status = program_json[PROGRAM_OPTIDOS_FILL_LEVEL_A][PROGRAM_OPTIDOS_FILL_LEVEL_ACT]
+        if PROGRAM_STATUS_IDLE in program_state.status:
+            self._program_state = program_state
+            self._logger.info("No program information available because no program is active")
+            return False
 
-        if PROGRAM_OPTIDOS_FILL_LEVEL_B in program_json:
-            self._optidos_b_status = program_json[PROGRAM_OPTIDOS_FILL_LEVEL_B][PROGRAM_OPTIDOS_FILL_LEVEL_ACT]
+        self._program_state = self._parse_response(self.PROGRAM_SCHEMA, program_json, COMMAND_GET_PROGRAM,
+                                                   fetched_at=fetched_at)
 
-        self._optidos_active = False
-        if PROGRAM_OPTIDOS in program_json:
-            self._optidos_config = program_json[PROGRAM_OPTIDOS][PROGRAM_OPTIDOS_SET]
+        self._logger.info("Go program information. Active program: %s, minutes to end: %.0f, end time: %s",
+                          self.program_name, self.seconds_to_end / 60, self.date_time_end)
 
-            # TODO: Add support for other optiDos configurations
-            if self._optidos_config == PROGRAM_OPTIDOS_DETERGENT_A_B:
-                self._optidos_active = True
-            else:
-                self._logger.info("Unknown optiDos configuration / status")
-        else:
+        return True
+
+    def _read_optidos_details(self, program_json: Dict[Any, Any]) -> OptiDosState:
+        """Read optiDos information from given program response"""
+
+        optidos_state = self._parse_response(self.OPTIDOS_SCHEMA, program_json, COMMAND_GET_PROGRAM)
+        if not optidos_state.config:
             self._logger.info("optiDos is not active / available")
+        elif not optidos_state.active:
+            # TODO: Add support for other optiDos configurations
+            self._logger.info("Unknown optiDos configuration / status")
 
         self._logger.info("optiDos information: %s optiDos A status: %s, optiDos B status: %s",
-                          self._optidos_config, self.optidos_a_status, self.optidos_b_status)
+                          optidos_state.config, optidos_state.a_status, optidos_state.b_status)
+
+        return optidos_state
 
     async def load_consumption_data(self) -> bool:
         """Load power and water consumption data by calling the corresponding API endpoint"""
-
-        self._logger.info("Loading power and water consumption data for %s", self._host)
         try:
-            consumption_total = await self.do_consumption_details_request(COMMAND_VALUE_ECOM_STAT_TOTAL)
-            self._power_consumption_kwh_total = read_kwh_from_string(consumption_total)
-            self._water_consumption_l_total = read_liter_from_string(consumption_total)
-
-            consumption_avg = await self.do_consumption_details_request(COMMAND_VALUE_ECOM_STAT_AVG)
-            self._power_consumption_kwh_avg = read_kwh_from_string(consumption_avg)
-            self._water_consumption_l_avg = read_liter_from_string(consumption_avg)
-
-            self._logger.info("Power consumption total: %s kWh, avg: %.1f kWh",
-                              locale.format_string('%.0f', self._power_consumption_kwh_total, True),
-                              self._power_consumption_kwh_avg)
-
-            self._logger.info("Water consumption total: %s l, avg: %.0f l",
-                              locale.format_string('%.0f', self._water_consumption_l_total, True),
-                              self._water_consumption_l_avg)
-
+            await self._load_part(DATA_CONSUMPTION, self._fetch_consumption_data)
         except DeviceError as e:
             self._error_code = e.error_code
             self._error_message = e.message
@@ -168,49 +191,106 @@ class WashingMachine(BasicDevice):
 
         return True
 
+    async def _fetch_consumption_data(self) -> None:
+        """Like load_consumption_data(), but raises DeviceError"""
+        self._logger.info("Loading power and water consumption data for %s", self._host)
+
+        consumption_total, consumption_avg = await self._gather_calls(
+            self.do_consumption_details_request(COMMAND_VALUE_ECOM_STAT_TOTAL),
+            self.do_consumption_details_request(COMMAND_VALUE_ECOM_STAT_AVG))
+
+        # Power and water are sent in one string, e.g. " 29 kWh,  2119ℓ "
+        kwh_total, liter_total = read_consumption_from_string(unwrap_call_result(consumption_total), 'kwh', 'liter')
+        kwh_avg, liter_avg = read_consumption_from_string(unwrap_call_result(consumption_avg), 'kwh', 'liter')
+        self._consumption_stats = ConsumptionStats(power_kwh_total=kwh_total, power_kwh_avg=kwh_avg,
+                                                   water_l_total=liter_total, water_l_avg=liter_avg)
+
+        self._logger.info("Power consumption total: %s kWh, avg: %.1f kWh",
+                          locale.format_string('%.0f', self.power_consumption_kwh_total, True),
+                          self.power_consumption_kwh_avg)
+
+        self._logger.info("Water consumption total: %s l, avg: %.0f l",
+                          locale.format_string('%.0f', self.water_consumption_l_total, True),
+                          self.water_consumption_l_avg)
+
+    @property
+    def program_state(self) -> ProgramState:
+        return self._program_state
+
+    @property
+    def optidos_state(self) -> OptiDosState:
+        return self._optidos_state
+
+    @property
+    def consumption_stats(self) -> ConsumptionStats:
+        return self._consumption_stats
+
     @property
     def program_status(self) -> str:
-        return self._program_status
+        return self._program_state.status
 
     @property
     def program_name(self) -> str:
-        return self._program_name
+        return self._program_state.name
 
     @property
     def optidos_active(self) -> bool:
-        return self._optidos_active
+        return self._optidos_state.active
 
     @property
     def optidos_a_status(self) -> str:
-        return self._optidos_a_status
+        return self._optidos_state.a_status
 
     @property
     def optidos_b_status(self) -> str:
-        return self._optidos_b_status
+        return self._optidos_state.b_status
 
     @property
     def seconds_to_end(self) -> int:
-        return self._seconds_to_end
+        """Remaining seconds of the program, counted down since the program state was fetched"""
+        return math.ceil(self._program_state.remaining(self._program_state.seconds_to_end))
 
     @property
     def date_time_end(self) -> datetime:
-        return datetime.now() + timedelta(seconds=self.seconds_to_end)
+        return self.get_date_time_end()
 
     def get_date_time_end(self, tz=None) -> datetime:
-        return datetime.now(tz) + timedelta(seconds=self.seconds_to_end)
+        seconds_to_end = self._program_state.remaining(self._program_state.seconds_to_end)
+        return datetime.now(tz) + timedelta(seconds=seconds_to_end)
+
+    @property
+    def program_refresh_due_in(self) -> float:
+        """Seconds until the program state must be refreshed (see ProgramState.refresh_due_in())"""
+        return self._program_state.refresh_due_in(self.max_program_state_age)
+
+    @property
+    def is_program_state_stale(self) -> bool:
+        return self.program_refresh_due_in <= 0
+
+    def _part_loaders(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        return {**super()._part_loaders(),
+                DATA_PROGRAM: self._fetch_program_details,
+                DATA_OPTIDOS: functools.partial(self._fetch_program_details, True),
+                DATA_CONSUMPTION: self._fetch_consumption_data}
+
+    def get_tracked_fields(self) -> Dict[str, Any]:
+        values = super().get_tracked_fields()
+        # Report the fetched countdown, the extrapolated one changes without a refresh
+        values['seconds_to_end'] = self._program_state.seconds_to_end
+        return values
 
     @property
     def power_consumption_kwh_total(self) -> float:
-        return self._power_consumption_kwh_total
+        return self._consumption_stats.power_kwh_total
 
     @property
     def power_consumption_kwh_avg(self) -> float:
-        return self._power_consumption_kwh_avg
+        return self._consumption_stats.power_kwh_avg
 
     @property
     def water_consumption_l_total(self) -> float:
-        return self._water_consumption_l_total
+        return self._consumption_stats.water_l_total
 
     @property
     def water_consumption_l_avg(self) -> float:
-        return self._water_consumption_l_avg
+        return self._consumption_stats.water_l_avg